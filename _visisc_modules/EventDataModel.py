@@ -4,18 +4,124 @@
 #
 # License: BSD 3 clause
 
-from numpy import array,r_, ndarray
+import os
+import sys
+import json
+import hashlib
+import tempfile
+from threading import RLock
+from multiprocessing import Pool, cpu_count
+from multiprocessing.sharedctypes import RawArray
+
+from numpy import array, r_, ndarray, ones, zeros, empty, arange, asarray, fmax, integer, frombuffer, prod, int32, \
+    nonzero, concatenate, ascontiguousarray, save, load, unique, uint64
+from numpy.lib.format import open_memmap
+from scipy.sparse import csr_matrix, issparse, hstack, vstack
 
 from pyisc import AnomalyDetector, DataObject
 from pyisc import P_PoissonOnesided, P_Poisson
-from visisc import _EventDataModel, \
+from visisc import _EventDataModel, _EventExpansion, \
     EventHierarchyElement, \
     EventDataObject, \
+    SparseEventDataObject, \
+    EventScoreStore, \
     get_global_num_of_severity_levels, \
-    set_global_num_of_severity_levels
+    set_global_num_of_severity_levels, \
+    profiler, \
+    profiled
 __author__ = 'tol'
 
 
+def _is_column_reference(column):
+    return isinstance(column, (int, long, integer, basestring))
+
+def _get_column(X, column):
+    '''
+    Returns the values of a column in X, where column is either a column index, a DataFrame column label or
+    already an array with one value per row.
+    '''
+    if column is None:
+        return None
+    if not _is_column_reference(column):
+        values = asarray(column)
+        assert len(values) == X.shape[0]
+        return values
+    if issparse(X):
+        return X[:, column].toarray().ravel()
+    if hasattr(X, 'iloc'):
+        return (X[column] if column in X.columns else X.iloc[:, column]).values
+    return X[:, column]
+
+def _get_columns(X, columns):
+    '''
+    Returns the event frequency counts of the given columns in X as a float matrix, which is sparse if X is sparse.
+    '''
+    if issparse(X):
+        return X.tocsr()[:, columns].astype(float)
+    if hasattr(X, 'iloc'):
+        columns = [X.columns.get_loc(col) if col in X.columns else col for col in columns]
+        return X.iloc[:, columns].values.astype(float)
+    return X[:, columns].astype(float)
+
+
+def _get_row_keys(rows):
+    '''
+    Returns a key of the values of each row in a float matrix, a weighted sum of the bit patterns of the values with
+    wrap around, used for checking that stored anomaly details belong to a row.
+    '''
+    values = ascontiguousarray(rows, dtype=float).view(uint64)
+    weights = (arange(1, values.shape[1]+1, dtype=uint64)*uint64(0x9E3779B97F4A7C15)) | uint64(1)
+    return (values*weights).sum(axis=1, dtype=uint64)
+
+
+def _shared_empty(shape):
+    '''
+    Returns a float array that is placed in shared memory, so that it is shared with (and can be written by) worker
+    processes forked after its creation.
+    '''
+    size = int(prod(shape))
+    return frombuffer(RawArray('d', max(size, 1)), dtype=float)[:size].reshape(shape)
+
+
+def _save_array(path, name, values):
+    '''
+    Saves an array as name.npy in the directory path. The array is written to a temporary file that then replaces the
+    file, so that the arrays of a loaded model, which may be memory mapped from the files, can be saved to the
+    directory the model was loaded from.
+    '''
+    fd, tmp_filename = tempfile.mkstemp(suffix='.npy', dir=path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            save(f, values)
+        filename = os.path.join(path, name + '.npy')
+        if os.name == 'nt' and os.path.exists(filename):
+            os.remove(filename)
+        os.rename(tmp_filename, filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+
+
+# The model, the row indexes and the output arrays used by the scoring worker processes. They are set before the
+# worker processes are forked, so the workers inherit the fitted anomaly detector and the data object.
+_pool_model = None
+_pool_indices = None
+_pool_outputs = None
+
+def _calc_many_in_worker(row_range):
+    start, stop = row_range
+    # The scoring lock was held by the forking thread, which does not exist in the worker process
+    _pool_model._scoring_lock = RLock()
+    for output, values in zip(_pool_outputs, _pool_model._score_rows(_pool_indices[start:stop])):
+        output[start:stop] = values
+    return stop - start
+
+def _fit_and_score_shard_in_worker(class_value):
+    _pool_model._scoring_lock = RLock()
+    _pool_model._fit_and_score_shard(class_value, *_pool_outputs)
+    return class_value
+
+
 class EventDataModel(_EventDataModel):
     class_column = None
     period_column = None
@@ -24,7 +130,34 @@ class EventDataModel(_EventDataModel):
     _anomaly_detector = None
     num_of_event_columns = None
     num_of_severity_levels_ = None
+    _aggregation_matrix = None
+    _aggregation_columns = None
+    _severity_components = None
+    # The option the anomaly detector was fitted with, None if not fitted
+    _poisson_onesided = None
+    # Precomputed (devs, severities, expect) of all rows, as loaded by load or computed when fitting by class, or None
+    _scores = None
+    # The directory of the EventScoreStore used by calc_one and calc_many and the store of the current model and data
+    _score_store_directory = None
+    _score_store = None
+    # When the anomaly detector is sharded by class: the rows each class was fitted on and the anomaly detectors
+    # fitted in this process, by class value
+    _shard_rows = None
+    _shard_detectors = None
+    # The number of rows, from the first, that the anomaly detector was fitted on, see get_fingerprint
+    _num_of_fitted_rows = None
+    # The digest of the first _num_of_digested_rows rows of the event data object, see _get_rows_digest
+    _rows_digest = None
+    _num_of_digested_rows = 0
+
+    # The version of the format written by save
+    _save_format_version = 1
 
+    def __init__(self, *args):
+        _EventDataModel.__init__(self, *args)
+        # The anomaly detector is not reentrant, so scoring from several threads is serialized, while the other
+        # read-only methods can be called concurrently.
+        self._scoring_lock = RLock()
 
     @staticmethod
     def flat_model(event_columns, event_names=None):
@@ -63,6 +196,7 @@ class EventDataModel(_EventDataModel):
             model.num_of_event_columns = num_of_event_columns
             model._event_sev2original_column_map = _event_sev2original_column_map
             model.num_of_severity_levels_ = 1
+            model._compile_model()
 
             return model
 
@@ -92,45 +226,29 @@ class EventDataModel(_EventDataModel):
 
         if event_columns is not None and len(event_columns) > 0:
             # Create Event hierarchy
-            root = EventHierarchyElement("Root")
-            events = {root.name:root}
-            num_of_event_columns = 0
-            for i in range(len(event_columns)):
-                path0 = get_event_path(event_columns[i]) if get_event_path is not None else ["%i" % event_columns[i]]
-                severity_level = get_severity_level(event_columns[i]) if get_severity_level is not None else 0
-                parent = root
-                if root.get_index_value(severity_level) == -1:
-                    root.set_index_value(severity_level, 0)
-                    num_of_event_columns += 1
-                for h in range(1,len(path0)+1):
-                    path = str(sep.join([root.name]+path0[:h]))
-                    if path in events.keys():
-                        event = events[path]
-                    else:
-                        event = EventHierarchyElement(path)
-                        events[path] = event
-                        parent.add_child(event)
-                    if event.get_index_value(severity_level) == -1:
-                        event.set_index_value(severity_level, i) # index to be replaced with true column index later
-                        num_of_event_columns += 1
-                    parent = event
-
+            paths = [get_event_path(column) if get_event_path is not None else ["%i" % column] for column in event_columns]
+            severities = [get_severity_level(column) for column in event_columns] if get_severity_level is not None else None
+            root = EventHierarchyElement.from_paths(paths, severities, sep)
 
             # Replace root if original root has only one child
             if root.num_of_children == 1:
-                for sev_lev_ind in xrange(num_of_severity_levels):
-                    if root.get_index_value(sev_lev_ind) != -1:
-                        num_of_event_columns -= 1
                 new_root = root.child_
-                del events[root.name]
-                for name in events.keys():
-                    event = events[name]
-                    del events[name]
-                    event.name = name[len(root.name) + 1:]
-                    events[event.name] = event
+                event = new_root
+                while event is not None:
+                    event.name = event.name[len(root.name) + 1:]
+                    event = event.next()
+                root.remove_child(new_root)
                 root = new_root
-                root.parent_ = None
-                root.parent = None
+
+            num_of_events = 0
+            num_of_event_columns = 0
+            event = root
+            while event is not None:
+                num_of_events += 1
+                for sev_lev_ind in xrange(num_of_severity_levels):
+                    if event.get_index_value(sev_lev_ind) != -1:
+                        num_of_event_columns += 1
+                event = event.next()
 
             # Create new data object with hierarchical structure
 
@@ -150,108 +268,566 @@ class EventDataModel(_EventDataModel):
                         new_column += 1
                 event = event.next()
 
-            model = EventDataModel(root, len(events), 0)
+            model = EventDataModel(root, num_of_events, 0)
             model.root = root
             model.root_column = root_column
             model.num_of_event_columns = num_of_event_columns
             model._event_sev2original_column_map = _event_sev2original_column_map
             model.num_of_severity_levels_ = num_of_severity_levels
+            model._compile_model()
 
             return model
 
         raise ValueError("No columns provided")
 
+    @profiled("data_object")
     def data_object(self, X, period_column, date_column, source_column, class_column=None):
         '''
         Creates a EventDataObject using the event model. It only takes a single, common period for all events.
 
-        :param X: an numpy array
-        :param period_column: column index pointing to the column containing the period.
-        :param date_column: column index pointing to the date of each row, instance of datetime.date
-        :param source_column: column index pointing to the identifier of the source of each row: must be convertible to str.
-        :param class_column: column index pointing to the class of the source of each row.
+        The event frequency counts are only read from the original event columns of X and are kept as floats, so X
+        can be a numeric count matrix, while the dates, sources and classes are given as separate arrays instead of
+        as column indexes.
+
+        :param X: an numpy array or a pandas DataFrame with the frequency counts in the original event columns.
+        :param period_column: column index (or DataFrame column label) pointing to the column containing the period,
+        or an array with the period of each row.
+        :param date_column: column index (or label) pointing to the date of each row, instance of datetime.date, or
+        an array with the date of each row, like a numpy.datetime64 array.
+        :param source_column: column index (or label) pointing to the identifier of the source of each row: must be
+        convertible to str, or an array with the source identifier of each row.
+        :param class_column: column index (or label) pointing to the class of the source of each row, or an array with
+        the (numeric) class of each row, or None for no classes, then the class column of the new data matrix is zero.
         :return: an instance of EventDataObject with new column structure reflecting the event data model.
         '''
-        assert isinstance(X, ndarray)
+        self.class_column = 0 if class_column is not None else None
+        self.period_column = 1
 
-        XT = X.T
+        X_new, dates, sources = self._aggregate(X, period_column, date_column, source_column, class_column)
 
-        offset_columns = [col for col in [class_column, period_column] if col is not None]
+        self._event_data_object = self._create_event_data_object(X_new, dates, sources)
+        self._scores = None
+        self._score_store = None
+        self._rows_digest = None
 
-        X_newT = r_[
-            XT[offset_columns],
-            array([[0.0 for _ in xrange(len(X))] for _ in xrange(self.num_of_event_columns)])
-        ]
-        self.class_column = 0 if class_column > -1 else None
-        self.period_column = 1 if self.class_column == 0 else 0
+        return self._event_data_object
 
-        # Sum the frequency counts of sub types, starting from the leaves and up
-        event = self.root
-        while event is not None:
-            if event.num_of_children == 0: # If leaf
-                for sev_lev_ind in xrange(self.num_of_severity_levels_):
-                    if event.get_index_value(sev_lev_ind) != -1:
-                        current = event
-                        while current is not None:
-                            X_newT[current.get_index_value(sev_lev_ind)] += XT[self._event_sev2original_column_map[(event.name,sev_lev_ind)]]
-                            current = current.parent
-            event = event.next()
+    @profiled("data_object_from_chunks")
+    def data_object_from_chunks(self, chunks, period_column, date_column, source_column, class_column=None,
+                                num_of_rows=None, filename=None):
+        '''
+        Creates a EventDataObject like data_object, but from an iterable of row chunks, like the chunks of a CSV
+        reader or the rows fetched from a database cursor, so that the raw data never has to be in memory at once.
+        Each chunk is aggregated through the event hierarchy on its own.
+
+        If num_of_rows is given, the data matrix is allocated before the first chunk is read, in shared memory or as
+        a memory mapped .npy file if filename is given, and each chunk is aggregated directly into it. Then the memory
+        used, apart from the data matrix, the dates, the sources and the copy held by the C++ data object, is bounded
+        by the chunk size. Otherwise, the aggregated chunks are kept until all chunks are read and then copied into the
+        data matrix, or stacked into a SparseEventDataObject if the chunks are sparse.
+
+        :param chunks: an iterable of numpy arrays, pandas DataFrames or scipy.sparse matrices with the columns of X
+        in data_object.
+        :param period_column: column index (or DataFrame column label) of the period in each chunk.
+        :param date_column: column index (or label) of the date in each chunk.
+        :param source_column: column index (or label) of the source identifier in each chunk.
+        :param class_column: column index (or label) of the class in each chunk, or None.
+        :param num_of_rows: the number of rows in all chunks, or an upper bound, or None if not known.
+        :param filename: the .npy file where the data matrix is memory mapped, requires num_of_rows.
+        :return: an instance of EventDataObject or SparseEventDataObject.
+        '''
+        for column in [period_column, date_column, source_column, class_column]:
+            if column is not None and not _is_column_reference(column):
+                raise ValueError("The columns of the chunks must be given as column indexes or labels")
+        if filename is not None and num_of_rows is None:
+            raise ValueError("num_of_rows must be given when the data matrix is memory mapped")
+
+        self.class_column = 0 if class_column is not None else None
+        self.period_column = 1
+        num_of_columns = 2 + self.num_of_event_columns
+
+        X_new = None
+        if num_of_rows is not None:
+            X_new = _shared_empty((num_of_rows, num_of_columns)) if filename is None else \
+                open_memmap(filename, mode='w+', dtype=float, shape=(num_of_rows, num_of_columns))
 
-        # End creating data object
-        self._event_data_object = EventDataObject(X_newT.T,class_column=self.class_column)
-        self._event_data_object.model_ = self
-        self._event_data_object.dates_ = XT[date_column]
-        self._event_data_object.sources_ = array([str(t) for t in XT[source_column]])
+        matrices = []
+        dates = []
+        sources = []
+        num_of_read_rows = 0
+        for X in chunks:
+            start = num_of_read_rows
+            num_of_read_rows += X.shape[0]
+            if X_new is not None and num_of_read_rows > num_of_rows:
+                raise ValueError("The chunks have more than %i rows" % num_of_rows)
+            out = X_new[start:num_of_read_rows] if X_new is not None else None
+            chunk_rows, chunk_dates, chunk_sources = self._aggregate(X, period_column, date_column, source_column,
+                                                                     class_column, out)
+            if X_new is None:
+                matrices.append(chunk_rows)
+            dates.append(chunk_dates)
+            sources.append(chunk_sources)
+
+        if num_of_read_rows == 0:
+            raise ValueError("The chunks have no rows")
+
+        if X_new is not None:
+            X_new = X_new[:num_of_read_rows]
+        elif any(issparse(matrix) for matrix in matrices):
+            X_new = vstack(matrices, format='csr')
+        else:
+            X_new = _shared_empty((num_of_read_rows, num_of_columns))
+            start = 0
+            for matrix in matrices:
+                X_new[start:start+len(matrix)] = matrix
+                start += len(matrix)
+        del matrices
+
+        self._event_data_object = self._create_event_data_object(X_new, concatenate(dates), concatenate(sources))
+        self._scores = None
+        self._score_store = None
+        self._rows_digest = None
 
         return self._event_data_object
 
-    def fit_anomaly_detector(self, data_object, poisson_onesided=True):
-        if poisson_onesided:
-            anomaly_detector = AnomalyDetector([
-                                                   P_PoissonOnesided(self.root_column+i, self.period_column)
-                                                   for i in xrange(self.num_of_event_columns)
-                                                   ])
+    @profiled("append")
+    def append(self, X, period_column, date_column, source_column, class_column=None, refit=False):
+        '''
+        Appends new rows, like the data of a new day, to the event data object of the model. Only the new rows are
+        aggregated through the event hierarchy, sorted into the index of the rows by source and date (if built) and
+        scored by the anomaly detector. The C++ data object cannot grow, so it is recreated from the aggregated data
+        matrix, which is only copied.
+
+        :param X: an numpy array or a pandas DataFrame with the new rows, see data_object.
+        :param period_column: see data_object.
+        :param date_column: see data_object.
+        :param source_column: see data_object.
+        :param class_column: see data_object, must be given if it was given when the event data object was created.
+        :param refit: boolean that indicates whether the anomaly detector should be updated with the new rows
+        (incrementally), and with any rows appended before without refitting, before they are scored. Then, the scores
+        of all previous rows are changed as well.
+        :return: a tuple (new_indexes, devs, severities, expect) with the row indexes of the new rows in the event
+        data object and their anomaly details as returned by calc_many.
+        '''
+        assert self._event_data_object is not None
+        assert (class_column is None) == (self.class_column is None)
+
+        old_data_object = self._event_data_object
+        num_of_old_rows = len(old_data_object)
+
+        new_rows, dates, sources = self._aggregate(X, period_column, date_column, source_column, class_column)
+
+        if self._shard_rows is not None and not refit:
+            # Checked before the model is changed, the new rows could not be scored
+            new_classes = unique(_get_column(new_rows, self.class_column))
+            unknown_classes = [class_value for class_value in new_classes if class_value not in self._shard_rows]
+            if len(unknown_classes) > 0:
+                raise ValueError("No anomaly detector is fitted for classes %s, append them with refit=True" %
+                                 ", ".join(str(class_value) for class_value in unknown_classes))
+
+        if issparse(old_data_object.matrix_):
+            X_new = vstack([old_data_object.matrix_, new_rows], format='csr')
         else:
-            anomaly_detector = AnomalyDetector([
-                                                   P_Poisson(self.root_column+i, self.period_column)
-                                                   for i in xrange(self.num_of_event_columns)
-                                                   ])
+            if issparse(new_rows):
+                new_rows = new_rows.toarray()
+            X_new = _shared_empty((num_of_old_rows + new_rows.shape[0], new_rows.shape[1]))
+            X_new[:num_of_old_rows] = old_data_object.matrix_
+            X_new[num_of_old_rows:] = new_rows
 
-        self._anomaly_detector = anomaly_detector.fit(data_object)
+        self._event_data_object = self._create_event_data_object(
+            X_new,
+            r_[old_data_object.dates_, dates],
+            r_[old_data_object.sources_, sources]
+        )
+        if old_data_object.source_names_ is not None:
+            # Only the new rows are sorted, and merged into the index of the previous rows
+            self._event_data_object.build_index(old_data_object)
 
-        return anomaly_detector
+        new_indexes = arange(num_of_old_rows, X_new.shape[0])
 
-    def get_event_column_names(self, only_basic_events=False):
-        names = []
+        if refit:
+            # The anomaly detectors are not reentrant, so no other thread may score while they are updated
+            with self._scoring_lock:
+                # The rows the anomaly detectors are not fitted on, the new rows and the rows appended before without
+                # refitting, so that the detectors stay fitted on the first _num_of_fitted_rows rows
+                unfitted_indexes = arange(self._num_of_fitted_rows, len(self._event_data_object))
+                # The detectors whose fitting was deferred by load are fitted on the previously fitted rows before
+                # _num_of_fitted_rows is changed, see _get_anomaly_detector and _get_shard_detector
+                if self._shard_rows is not None:
+                    self._refit_shards(unfitted_indexes)
+                else:
+                    self._get_anomaly_detector().fit_incrementally(
+                        EventDataObject(self._event_data_object.get_rows(unfitted_indexes),
+                                        class_column=self.class_column)
+                    )
+                self._num_of_fitted_rows = len(self._event_data_object)
+
+        # Precomputed scores are kept and extended with the scores of the new rows, unless the detector was changed
+        old_scores = None if refit else self._scores
+        self._scores = None
+        if refit:
+            self._score_store = None
+        elif self._score_store is not None:
+            # The fingerprint is not changed when the anomaly detector is not refitted, see get_fingerprint
+            self._score_store.set_num_of_rows(len(self._event_data_object))
+        new_scores = self.calc_many(new_indexes)
+        if old_scores is not None:
+            self._scores = tuple(r_[old, new] for old, new in zip(old_scores, new_scores))
+
+        return (new_indexes,) + new_scores
+
+    def _aggregate(self, X, period_column, date_column, source_column, class_column, out=None):
+        '''
+        Creates the data matrix with the aggregated event columns of the model from X, see data_object. If out is
+        given, the data matrix is written into it, also when X is sparse.
+        :return: a tuple with the data matrix, and the dates and the sources of the rows.
+        '''
+        assert isinstance(X, ndarray) or hasattr(X, 'iloc') or issparse(X)
+
+        periods = _get_column(X, period_column)
+        dates = _get_column(X, date_column)
+        sources = _get_column(X, source_column)
+        classes = _get_column(X, class_column)
+
+        counts = _get_columns(X, self._aggregation_columns)
+
+        # The event columns always start at root_column, so without classes the class column is all zeros
+        offset_columns = [classes if classes is not None else zeros(counts.shape[0]), periods]
+
+        if issparse(counts) and out is None:
+            # Kept sparse, see SparseEventDataObject
+            X_new = hstack([csr_matrix(asarray(col, dtype=float).reshape(-1, 1)) for col in offset_columns] +
+                           [self._aggregation_matrix.dot(counts.T).T], format='csr')
+            return X_new, asarray(dates).astype('datetime64[D]'), asarray(sources).astype(str)
+
+        if out is None:
+            X_new = _shared_empty((counts.shape[0], len(offset_columns) + self.num_of_event_columns))
+        else:
+            X_new = out
+            assert X_new.shape == (counts.shape[0], len(offset_columns) + self.num_of_event_columns)
+        for i in xrange(len(offset_columns)):
+            X_new[:, i] = offset_columns[i]
+
+        # Sum the frequency counts of sub types, from the leaves and up, see _compile_aggregation_matrix
+        aggregated = self._aggregation_matrix.dot(counts.T).T
+        X_new[:, len(offset_columns):] = aggregated.toarray() if issparse(aggregated) else aggregated
+
+        return X_new, asarray(dates).astype('datetime64[D]'), asarray(sources).astype(str)
+
+    def _create_event_data_object(self, X_new, dates, sources):
+        if issparse(X_new):
+            event_data_object = SparseEventDataObject(X_new, class_column=self.class_column)
+        else:
+            event_data_object = EventDataObject(X_new,class_column=self.class_column)
+        event_data_object.model_ = self
+        event_data_object.matrix_ = X_new
+        event_data_object.dates_ = dates
+        event_data_object.sources_ = sources
+        return event_data_object
+
+    def _compile_model(self):
+        '''
+        Precomputes the structures used for aggregating and summarizing event data, must be called when the
+        event hierarchy is completed.
+        '''
+        self._compile_hierarchy()
+        self._compile_aggregation_matrix()
+        self._compile_severity_components()
+
+    def _compile_hierarchy(self):
+        '''
+        Compiles the event hierarchy into a flat, depth first ordered representation, both in C++ and as numpy arrays
+        with one element per node: node_parent_ (-1 for the root), node_subtree_end_ (the node after the last node in
+        the subtree), node_depth_, and with one column per severity level, node_index_ (the index into the data vector
+        or -1) and node_component_ (the component model index or -1). The elements and their names are kept in
+        node_elements_ and node_names_.
+        '''
+        self.compile_hierarchy()
+
+        num_of_nodes = self.get_num_of_nodes()
+        self.node_parent_ = empty(num_of_nodes, dtype=int32)
+        self.node_subtree_end_ = empty(num_of_nodes, dtype=int32)
+        self.node_depth_ = empty(num_of_nodes, dtype=int32)
+        self.node_index_ = empty((num_of_nodes, self.num_of_severity_levels_), dtype=int32)
+        self.node_component_ = empty((num_of_nodes, self.num_of_severity_levels_), dtype=int32)
+        if not self.copy_compiled_hierarchy(self.node_parent_, self.node_subtree_end_, self.node_depth_,
+                                            self.node_index_, self.node_component_):
+            raise RuntimeError("The compiled event hierarchy could not be copied")
+
+        self.node_elements_ = []
         event = self.root
         while event is not None:
-            if not only_basic_events or event.num_of_children == 0:
-                for sev_lev in xrange(self.num_of_severity_levels_):
-                    if event.get_index_value(sev_lev) != -1:
-                        names += [event.name+"/severity_"+ str(sev_lev)]
+            self.node_elements_.append(event)
             event = event.next()
-        return names
+        assert len(self.node_elements_) == num_of_nodes
+        self.node_names_ = [event.name for event in self.node_elements_]
+
+    def _is_leaf_node(self):
+        return self.node_subtree_end_ == arange(1, len(self.node_subtree_end_)+1)
+
+    def _compile_aggregation_matrix(self):
+        '''
+        Creates a sparse matrix that maps the original event columns to the event columns of the model, so that
+        the frequency counts of every event in the hierarchy is computed as the sum of the counts of all basic
+        events (leaves) below it. The counts of all events are then computed with a single matrix product in
+        data_object.
+        '''
+        original_columns = []
+        original_column_index = {}
+        rows = []
+        cols = []
+        is_leaf = self._is_leaf_node()
+        for sev_lev_ind in xrange(self.num_of_severity_levels_):
+            leaves = nonzero(is_leaf & (self.node_index_[:, sev_lev_ind] != -1))[0]
+            leaf_cols = empty(len(leaves), dtype=int)
+            for i in xrange(len(leaves)):
+                original_column = self._event_sev2original_column_map[(self.node_names_[leaves[i]],sev_lev_ind)]
+                if original_column not in original_column_index:
+                    original_column_index[original_column] = len(original_columns)
+                    original_columns.append(original_column)
+                leaf_cols[i] = original_column_index[original_column]
+
+            # Climb from all leaves to the root in parallel, one level at a time
+            current = leaves
+            while len(current) > 0:
+                used = self.node_index_[current, sev_lev_ind] != -1
+                rows.append(self.node_component_[current[used], sev_lev_ind])
+                cols.append(leaf_cols[used])
+                parents = self.node_parent_[current]
+                current = parents[parents != -1]
+                leaf_cols = leaf_cols[parents != -1]
+
+        # Duplicated entries are summed, in the same way as the counts were added in the original loop.
+        rows = concatenate(rows) if len(rows) > 0 else zeros(0, dtype=int)
+        cols = concatenate(cols) if len(cols) > 0 else zeros(0, dtype=int)
+        self._aggregation_matrix = csr_matrix((ones(len(rows)), (rows, cols)),
+                                              shape=(self.num_of_event_columns, len(original_columns)))
+        self._aggregation_columns = array(original_columns, dtype=int)
+
+    def _compile_severity_components(self):
+        '''
+        Creates a list with an array of component indexes for each severity level, so that the severities of many
+        rows can be summarized at once in summarize_event_anomalies and calc_many.
+        '''
+        self._severity_components = [
+            self.node_component_[self.node_index_[:, sev_lev_ind] != -1, sev_lev_ind].astype(int)
+            for sev_lev_ind in xrange(self.num_of_severity_levels_)
+        ]
+
+    @profiled("fit_anomaly_detector")
+    def fit_anomaly_detector(self, data_object, poisson_onesided=True, shard_by_class=False, n_jobs=1):
+        '''
+        Fits an anomaly detector with one component model per event column of the model.
+
+        :param data_object: the event data object of the model.
+        :param poisson_onesided: boolean that indicates whether only unexpectedly high frequencies are anomalous.
+        :param shard_by_class: boolean that indicates whether a separate anomaly detector is fitted for each source
+        class (the class_column given to data_object). The classes are fitted and all their rows scored in parallel
+        worker processes, and the scores are then used by calc_one and calc_many.
+        :param n_jobs: number of worker processes used when sharding by class, -1 means one per CPU. Worker processes
+        are forked, so on platforms without fork (Windows) the classes are always fitted in this process.
+        :return: the anomaly detector, or when sharding by class, a dictionary with the anomaly detectors fitted in
+        this process by class value (empty if fitted in worker processes, they are then fitted again when needed).
+        '''
+        self._poisson_onesided = poisson_onesided
+        self._num_of_fitted_rows = len(data_object)
+        self._scores = None
+        self._score_store = None
+        self._shard_rows = None
+        self._shard_detectors = None
+
+        if not shard_by_class:
+            self._anomaly_detector = self._fit_anomaly_detector(data_object)
+            return self._anomaly_detector
+
+        if self.class_column is None:
+            raise ValueError("Sharding by class requires that a class column was given to data_object")
+        assert data_object is self._event_data_object
+
+        self._init_shards()
+
+        devs = _shared_empty((len(data_object), self.num_of_event_columns))
+        expect = _shared_empty((len(data_object), data_object.matrix_.shape[1] - self._offset))
+
+        # The largest classes are started first
+        class_values = sorted(self._shard_rows, key=lambda class_value: -len(self._shard_rows[class_value]))
+
+        if n_jobs == -1:
+            n_jobs = cpu_count()
+        if n_jobs > 1 and len(class_values) > 1 and sys.platform != "win32":
+            global _pool_model, _pool_outputs
+            # The lock is held while forking so that no other thread is scoring in the copied process
+            with self._scoring_lock:
+                _pool_model, _pool_outputs = self, (devs, expect)
+                try:
+                    pool = Pool(min(n_jobs, len(class_values)))
+                    try:
+                        pool.map(_fit_and_score_shard_in_worker, class_values, chunksize=1)
+                    finally:
+                        pool.close()
+                        pool.join()
+                finally:
+                    _pool_model = _pool_outputs = None
+        else:
+            for class_value in class_values:
+                self._fit_and_score_shard(class_value, devs, expect)
+
+        self._scores = (devs, self._summarize_many(devs), expect)
+
+        return self._shard_detectors
+
+    def _fit_anomaly_detector(self, data_object):
+        anomaly_detector = self._create_anomaly_detector()
+        if isinstance(data_object, SparseEventDataObject):
+            # Fitted on one dense chunk at a time
+            chunks = data_object.get_chunks()
+            anomaly_detector.fit(next(chunks))
+            for chunk in chunks:
+                anomaly_detector.fit_incrementally(chunk)
+        else:
+            anomaly_detector.fit(data_object)
+        return anomaly_detector
+
+    def _get_anomaly_detector(self):
+        '''
+        Returns the anomaly detector, which is fitted on the first _num_of_fitted_rows rows if its fitting was
+        deferred by load.
+        '''
+        if self._anomaly_detector is None:
+            if self._poisson_onesided is None:
+                raise ValueError("No anomaly detector is fitted, see fit_anomaly_detector")
+            with self._scoring_lock:
+                if self._anomaly_detector is None:
+                    data_object = self._event_data_object
+                    if self._num_of_fitted_rows < len(data_object):
+                        rows = slice(0, self._num_of_fitted_rows)
+                        data_object = SparseEventDataObject(data_object.matrix_[rows], class_column=self.class_column) \
+                            if isinstance(data_object, SparseEventDataObject) else \
+                            EventDataObject(data_object.get_rows(rows), class_column=self.class_column)
+                    self._anomaly_detector = self._fit_anomaly_detector(data_object)
+        return self._anomaly_detector
+
+    def _init_shards(self, num_of_rows=None):
+        '''
+        Divides the rows by class, or only the first num_of_rows rows, which the anomaly detectors are fitted on.
+        '''
+        classes = self._event_data_object.get_column(self.class_column)[:num_of_rows]
+        self._shard_rows = dict((class_value, nonzero(classes == class_value)[0]) for class_value in unique(classes))
+        self._shard_detectors = {}
+        self._anomaly_detector = None
 
+    def _create_anomaly_detector(self):
+        if self._poisson_onesided:
+            return AnomalyDetector([
+                                       P_PoissonOnesided(self.root_column+i, self.period_column)
+                                       for i in xrange(self.num_of_event_columns)
+                                       ])
+        else:
+            return AnomalyDetector([
+                                       P_Poisson(self.root_column+i, self.period_column)
+                                       for i in xrange(self.num_of_event_columns)
+                                       ])
+
+    def _get_shard_detector(self, class_value):
+        '''
+        Returns the anomaly detector of a class, it is fitted on the rows of the class if not already fitted in this
+        process.
+        '''
+        if class_value not in self._shard_rows:
+            raise ValueError("No anomaly detector is fitted for class %s" % class_value)
+        if class_value not in self._shard_detectors:
+            # Fitted under the lock, so that another thread neither fits it too nor scores meanwhile
+            with self._scoring_lock:
+                if class_value not in self._shard_detectors:
+                    rows = self._shard_rows[class_value]
+                    anomaly_detector = self._create_anomaly_detector()
+                    anomaly_detector.fit(
+                        EventDataObject(self._event_data_object.get_rows(rows), class_column=self.class_column)
+                    )
+                    self._shard_detectors[class_value] = anomaly_detector
+        return self._shard_detectors[class_value]
+
+    def _fit_and_score_shard(self, class_value, devs, expect):
+        '''
+        Fits the anomaly detector of a class and writes the scores of its rows into devs and expect.
+        '''
+        rows = self._shard_rows[class_value]
+        data_object = EventDataObject(self._event_data_object.get_rows(rows), class_column=self.class_column)
+        anomaly_detector = self._create_anomaly_detector().fit(data_object)
+        self._shard_detectors[class_value] = anomaly_detector
+        devs[rows], expect[rows] = self._score_data_object(anomaly_detector, data_object)
+
+    def _refit_shards(self, new_indexes):
+        '''
+        Updates the anomaly detectors of the classes of new rows with the new rows, see append.
+        '''
+        classes = self._event_data_object.get_column(self.class_column)[new_indexes]
+        for class_value in unique(classes):
+            rows = new_indexes[classes == class_value]
+            if class_value in self._shard_rows:
+                self._get_shard_detector(class_value).fit_incrementally(
+                    EventDataObject(self._event_data_object.get_rows(rows), class_column=self.class_column)
+                )
+                self._shard_rows[class_value] = r_[self._shard_rows[class_value], rows]
+            else:
+                # A new class, its anomaly detector is fitted when needed
+                self._shard_rows[class_value] = rows
+
+    def _score_data_object(self, anomaly_detector, data_object):
+        '''
+        Scores all rows in a data object, returns a tuple (devs, expect) with one row per data object row.
+        '''
+        devs_index = 1+anomaly_detector.is_clustering + (anomaly_detector.class_column > -1)
+
+        devs = empty((len(data_object), self.num_of_event_columns))
+        expect = None
+        with self._scoring_lock:
+            for data_index in xrange(len(data_object)):
+                result = anomaly_detector.anomaly_score_details(data_object, index=data_index)
+                if expect is None:
+                    expect = empty((len(data_object), len(result[devs_index+1])-self._offset))
+                devs[data_index] = result[devs_index]
+                expect[data_index] = result[devs_index+1][self._offset:]
+        if profiler.enabled:
+            profiler.count("swig.anomaly_score_details", len(data_object))
+        return devs, expect if expect is not None else zeros((0, self.num_of_event_columns))
 
+    def get_event_column_names(self, only_basic_events=False):
+        nodes, sev_levs = nonzero(self.node_index_ != -1)
+        if only_basic_events:
+            is_basic = self._is_leaf_node()[nodes]
+            nodes = nodes[is_basic]
+            sev_levs = sev_levs[is_basic]
+        return [self.node_names_[node]+"/severity_"+ str(sev_lev) for node, sev_lev in zip(nodes, sev_levs)]
 
     def get_column_names(self):
-        names = []
-        event = self.root
-        while event is not None:
-            for sev_lev in xrange(self.num_of_severity_levels_):
-                if event.get_index_value(sev_lev) != -1:
-                    names += [event.name+"/severity_"+ str(sev_lev)]
-            event = event.next()
-        return ([] if self.class_column is None else ['Class']) + ['Period'] + names;
+        # The class column is always in the data matrix, it is all zeros when no class column was given
+        return ['Class', 'Period'] + self.get_event_column_names();
 
+    @profiled("calc_one")
     def calc_one(self, data_index):
-        assert isinstance(data_index, int) and \
+        # Row indexes from numpy, like those of get_window_indexes, are not int on all platforms
+        assert isinstance(data_index, (int, long, integer)) and \
                data_index < len(self._event_data_object) and \
                data_index >= 0
+        data_index = int(data_index)
 
-        result  = self._anomaly_detector.anomaly_score_details(self._event_data_object, index=data_index)
+        if self._scores is not None:
+            devs, severities, expect = self._scores
+            return devs[data_index], severities[data_index], expect[data_index], None, None
 
-        devs_index = 1+self._anomaly_detector.is_clustering + (self._anomaly_detector.class_column > -1)
+        if self._get_score_store() is not None or self._shard_rows is not None:
+            devs, severities, expect = self.calc_many([data_index])
+            return devs[0], severities[0], expect[0], None, None
+
+        anomaly_detector = self._get_anomaly_detector()
+        with self._scoring_lock:
+            data_object, index = self._event_data_object.get_scoring_row(data_index)
+            result  = anomaly_detector.anomaly_score_details(data_object, index=index)
+        if profiler.enabled:
+            profiler.count("swig.anomaly_score_details")
+
+        devs_index = 1+anomaly_detector.is_clustering + (anomaly_detector.class_column > -1)
 
         devs = result[devs_index]
 
@@ -266,14 +842,423 @@ class EventDataModel(_EventDataModel):
 
         return devs, severities, expect, min_out, max_out
 
+    @profiled("calc_many")
+    def calc_many(self, indices=None, n_jobs=1, chunk_size=None):
+        '''
+        Computes the anomaly details for many rows at once and returns them as contiguous 2D arrays with one row
+        per data index.
+
+        :param indices: a sequence of row indexes into the event data object, or None for all rows.
+        :param n_jobs: number of worker processes used for the scoring, -1 means one per CPU. Worker processes
+        are forked, so on platforms without fork (Windows) the scoring is always done in this process.
+        :param chunk_size: number of rows scored by a worker process at a time, by default the rows are divided in
+        four chunks per worker process.
+        :return: a tuple (devs, severities, expect) where devs and expect are arrays of size number of indexes x
+        number of components and severities is an array of size number of indexes x number of severity levels.
+        '''
+        if indices is None:
+            indices = arange(len(self._event_data_object))
+        indices = asarray(indices, dtype=int)
+        assert indices.ndim == 1 and \
+               (len(indices) == 0 or (indices.min() >= 0 and indices.max() < len(self._event_data_object)))
+
+        if self._scores is not None:
+            return tuple(scores[indices] for scores in self._scores)
+
+        store = self._get_score_store()
+        if store is None or len(indices) == 0:
+            return self._score_rows(indices, n_jobs, chunk_size)
+
+        keys = self._get_row_keys(indices)
+        missing_positions = nonzero(~store.contains(indices, keys))[0]
+        if len(missing_positions) > 0:
+            missing, first_positions = unique(indices[missing_positions], return_index=True)
+            store.put_many(missing, keys[missing_positions[first_positions]],
+                           *self._score_rows(missing, n_jobs, chunk_size))
+
+        devs, severities, expect, stored = store.get_many(indices, keys)
+        if not stored.all():
+            # Lost when another process replaced the stored records meanwhile, see EventScoreStore._open_rows
+            lost_positions = nonzero(~stored)[0]
+            for values, lost_values in zip([devs, severities, expect], self._score_rows(indices[lost_positions])):
+                values[lost_positions] = lost_values
+        return devs, severities, expect
+
+    def _get_row_keys(self, indices):
+        return _get_row_keys(self._event_data_object.get_rows(indices))
+
+    def _score_rows(self, indices, n_jobs=1, chunk_size=None):
+        '''
+        Scores rows with the anomaly detector, see calc_many.
+        '''
+        if self._shard_rows is not None:
+            return self._score_shard_rows(indices)
+
+        # Fitted before any worker processes are forked
+        anomaly_detector = self._get_anomaly_detector()
+
+        if n_jobs == -1:
+            n_jobs = cpu_count()
+        if n_jobs > 1 and len(indices) > 1 and sys.platform != "win32":
+            return self._parallel_calc_many(indices, n_jobs, chunk_size)
+
+        devs_index = 1+anomaly_detector.is_clustering + (anomaly_detector.class_column > -1)
+
+        devs = None
+        expect = None
+        with self._scoring_lock:
+            for data_object, rows, data_indexes in self._event_data_object.get_scoring_batches(indices):
+                for row, index in zip(rows, data_indexes):
+                    result = anomaly_detector.anomaly_score_details(data_object, index=int(index))
+                    if devs is None:
+                        devs = empty((len(indices), len(result[devs_index])))
+                        expect = empty((len(indices), len(result[devs_index+1])-self._offset))
+                    devs[row] = result[devs_index]
+                    expect[row] = result[devs_index+1][self._offset:]
+        if profiler.enabled:
+            profiler.count("swig.anomaly_score_details", len(indices))
+
+        if devs is None:
+            devs = zeros((0, self.num_of_event_columns))
+            expect = zeros((0, self.num_of_event_columns))
+
+        return devs, self._summarize_many(devs), expect
+
+    def _score_shard_rows(self, indices):
+        '''
+        Scores rows with the anomaly detectors of their classes.
+        '''
+        devs = empty((len(indices), self.num_of_event_columns))
+        expect = empty((len(indices), self._event_data_object.matrix_.shape[1] - self._offset))
+
+        classes = self._event_data_object.get_column(self.class_column)[indices]
+        for class_value in unique(classes):
+            positions = nonzero(classes == class_value)[0]
+            data_object = EventDataObject(self._event_data_object.get_rows(indices[positions]), class_column=self.class_column)
+            devs[positions], expect[positions] = self._score_data_object(self._get_shard_detector(class_value), data_object)
+
+        return devs, self._summarize_many(devs), expect
+
+    def _parallel_calc_many(self, indices, n_jobs, chunk_size):
+        '''
+        Scores row ranges of indices in a pool of forked worker processes that write their results directly into
+        output arrays in shared memory.
+        '''
+        global _pool_model, _pool_indices, _pool_outputs
+
+        # The first row is used for finding out the sizes of the output arrays
+        first_results = self._score_rows(indices[:1])
+        outputs = tuple(_shared_empty((len(indices), result.shape[1])) for result in first_results)
+        for output, result in zip(outputs, first_results):
+            output[0] = result[0]
+
+        if chunk_size is None:
+            chunk_size = max(1, (len(indices) - 1) // (4 * n_jobs) + 1)
+        row_ranges = [(start, min(start + chunk_size, len(indices))) for start in xrange(1, len(indices), chunk_size)]
+
+        # The lock is held while forking so that no other thread is scoring in the copied process
+        with self._scoring_lock:
+            _pool_model, _pool_indices, _pool_outputs = self, indices, outputs
+            try:
+                pool = Pool(min(n_jobs, len(row_ranges)))
+                try:
+                    pool.map(_calc_many_in_worker, row_ranges, chunksize=1)
+                finally:
+                    pool.close()
+                    pool.join()
+            finally:
+                _pool_model = _pool_indices = _pool_outputs = None
+
+        return outputs
+
+    def score_all(self, n_jobs=1):
+        '''
+        Computes the anomaly details for all rows in the event data object, see calc_many.
+
+        :param n_jobs: number of worker processes used for the scoring, -1 means one per CPU.
+        :return: a tuple (devs, severities, expect) of 2D arrays with one row per data index.
+        '''
+        return self.calc_many(None, n_jobs=n_jobs)
+
+    def use_score_store(self, directory):
+        '''
+        Makes calc_one and calc_many (and thereby the EventVisualization) read the anomaly details through an
+        EventScoreStore kept in directory, so that each row is only scored once for the same model and data, also
+        by other processes using the same directory. The store is selected by get_fingerprint, so a new store is used
+        when the anomaly detector is changed, but not when rows are appended without refitting it.
+
+        :param directory: the directory of the score stores, or None for not using a store.
+        :return:
+        '''
+        self._score_store_directory = directory
+        self._score_store = None
+
+    def _get_score_store(self):
+        if self._score_store is None and self._score_store_directory is not None and \
+                self._event_data_object is not None and self._poisson_onesided is not None:
+            self._score_store = EventScoreStore(self._score_store_directory, self.get_fingerprint(),
+                                                len(self._event_data_object))
+        return self._score_store
+
+    def get_fingerprint(self):
+        '''
+        Returns a fingerprint of the model, the configuration of its anomaly detector and the rows the detector was
+        fitted on, which identifies the anomaly scores computed for rows with given values. Rows appended without
+        refitting the anomaly detector do not change the fingerprint.
+
+        :return: a hexadecimal SHA-1 string
+        '''
+        fingerprint = hashlib.sha1()
+        fingerprint.update(json.dumps([
+            self.num_of_severity_levels_, self.root_column, self.num_of_event_columns,
+            self.class_column, self.period_column, self._poisson_onesided, self._shard_rows is not None, self.node_names_,
+            sorted([name, sev_lev, str(column)] for (name, sev_lev), column in self._event_sev2original_column_map.items())
+        ]))
+        for values in [self.node_parent_, self.node_index_, self.node_component_]:
+            fingerprint.update(ascontiguousarray(values).data)
+        if self._event_data_object is not None:
+            num_of_rows = len(self._event_data_object) if self._num_of_fitted_rows is None else self._num_of_fitted_rows
+            fingerprint.update(self._get_rows_digest(num_of_rows))
+        return fingerprint.hexdigest()
+
+    def _get_rows_digest(self, num_of_rows, chunk_size=1024):
+        '''
+        Returns a SHA-1 digest of the values of the first num_of_rows rows in the event data object. The digest is
+        carried forward, so that only the rows added since the last call are hashed when rows have been appended.
+        '''
+        with self._scoring_lock:
+            if self._rows_digest is None or self._num_of_digested_rows > num_of_rows:
+                self._rows_digest = hashlib.sha1()
+                self._num_of_digested_rows = 0
+            # Hashed as dense rows, so that the digest does not depend on how the rows were divided
+            for start in xrange(self._num_of_digested_rows, num_of_rows, chunk_size):
+                rows = self._event_data_object.get_rows(slice(start, min(start + chunk_size, num_of_rows)))
+                self._rows_digest.update(ascontiguousarray(rows).data)
+            self._num_of_digested_rows = num_of_rows
+            return self._rows_digest.digest()
+
+    @profiled("save")
+    def save(self, path, save_scores=False, n_jobs=1):
+        '''
+        Saves the model, its event data object and optionally the anomaly scores of all rows to a directory, so that
+        it can be loaded again with EventDataModel.load without recreating the event data object or rescoring the
+        rows. The arrays are stored as .npy files, which are memory mapped when loaded, and the remaining model
+        properties in model.json. A loaded model can be saved to the directory it was loaded from, each file is replaced
+        when it has been written, see _save_array.
+
+        The fitted anomaly detector cannot be stored, so only the option it was fitted with is saved and the
+        detector is fitted again on the saved data when loaded. With save_scores, the rows need not be scored again.
+
+        :param path: the directory, which is created if it does not exist.
+        :param save_scores: boolean that indicates whether the anomaly details of all rows should be saved, they are
+        computed with score_all if not already precomputed.
+        :param n_jobs: number of worker processes used if the rows have to be scored, see calc_many.
+        :return:
+        '''
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        def json_value(value):
+            return int(value) if isinstance(value, (int, long, integer)) else value
+
+        metadata = {
+            'format_version': self._save_format_version,
+            'num_of_severity_levels': self.num_of_severity_levels_,
+            'root_column': self.root_column,
+            'num_of_event_columns': self.num_of_event_columns,
+            'class_column': self.class_column,
+            'period_column': self.period_column,
+            'poisson_onesided': self._poisson_onesided,
+            'shard_by_class': self._shard_rows is not None,
+            'node_names': self.node_names_,
+            'original_columns': [[name, sev_lev, json_value(column)]
+                                 for (name, sev_lev), column in self._event_sev2original_column_map.items()],
+            'has_data': self._event_data_object is not None,
+            'sparse_data': self._event_data_object is not None and issparse(self._event_data_object.matrix_),
+            'num_of_fitted_rows': self._num_of_fitted_rows,
+            'has_scores': save_scores
+        }
+
+        _save_array(path, 'node_parent', self.node_parent_)
+        _save_array(path, 'node_index', self.node_index_)
+        _save_array(path, 'node_component', self.node_component_)
+
+        if self._event_data_object is not None:
+            matrix = self._event_data_object.matrix_
+            if issparse(matrix):
+                # The CSR arrays are saved as they are, so that they can be memory mapped by load
+                _save_array(path, 'matrix_data', matrix.data)
+                _save_array(path, 'matrix_indices', matrix.indices)
+                _save_array(path, 'matrix_indptr', matrix.indptr)
+                _save_array(path, 'matrix_shape', asarray(matrix.shape))
+            else:
+                _save_array(path, 'matrix', matrix)
+            _save_array(path, 'dates', self._event_data_object.dates_)
+            _save_array(path, 'sources', self._event_data_object.sources_)
+
+        if save_scores:
+            devs, severities, expect = self._scores if self._scores is not None else self.score_all(n_jobs)
+            _save_array(path, 'devs', devs)
+            _save_array(path, 'severities', severities)
+            _save_array(path, 'expect', expect)
+
+        with open(os.path.join(path, 'model.json'), 'w') as f:
+            json.dump(metadata, f)
+
+    @staticmethod
+    @profiled("load")
+    def load(path, mmap_mode='r'):
+        '''
+        Loads a model saved with save. If the event data object was saved, it is recreated and, if the saved model
+        had a fitted anomaly detector, the detector is fitted again on the rows it was fitted on, but only when the
+        first row has to be scored. If scores were saved, they are used by calc_one and calc_many instead of scoring
+        the rows.
+
+        :param path: the directory the model was saved to.
+        :param mmap_mode: the mode used for memory mapping the saved arrays, see numpy.load, or None for reading them
+        into memory.
+        :return: an instance of EventDataModel
+        '''
+        with open(os.path.join(path, 'model.json')) as f:
+            metadata = json.load(f)
+        if metadata['format_version'] != EventDataModel._save_format_version:
+            raise ValueError("Unsupported model format version %s" % metadata['format_version'])
+
+        num_of_severity_levels = metadata['num_of_severity_levels']
+        set_global_num_of_severity_levels(num_of_severity_levels)
+
+        node_names = [str(name) for name in metadata['node_names']]
+        node_parent = load(os.path.join(path, 'node_parent.npy'))
+        node_index = load(os.path.join(path, 'node_index.npy'))
+        node_component = load(os.path.join(path, 'node_component.npy'))
+
+        # The nodes are in depth first order, so parents are created before their children and the children are
+        # added in their original order
+        events = []
+        for node in xrange(len(node_names)):
+            event = EventHierarchyElement(node_names[node])
+            for sev_lev_ind in xrange(num_of_severity_levels):
+                if node_index[node, sev_lev_ind] != -1:
+                    event.set_index_value(sev_lev_ind, int(node_index[node, sev_lev_ind]))
+                    event.set_index_component(sev_lev_ind, int(node_component[node, sev_lev_ind]))
+            if node_parent[node] != -1:
+                events[node_parent[node]].add_child(event)
+            events.append(event)
+        root = events[0]
+
+        model = EventDataModel(root, len(events), 0)
+        model.root = root
+        model.root_column = metadata['root_column']
+        model.num_of_event_columns = metadata['num_of_event_columns']
+        model._event_sev2original_column_map = dict(((str(name), sev_lev), column)
+                                                    for name, sev_lev, column in metadata['original_columns'])
+        model.num_of_severity_levels_ = num_of_severity_levels
+        model._compile_model()
+
+        if metadata['has_data']:
+            model.class_column = metadata['class_column']
+            model.period_column = metadata['period_column']
+            if metadata.get('sparse_data', False):
+                matrix = csr_matrix(tuple(load(os.path.join(path, 'matrix_' + name + '.npy'), mmap_mode=mmap_mode)
+                                          for name in ['data', 'indices', 'indptr']),
+                                    shape=tuple(load(os.path.join(path, 'matrix_shape.npy'))), copy=False)
+            else:
+                matrix = load(os.path.join(path, 'matrix.npy'), mmap_mode=mmap_mode)
+            model._event_data_object = model._create_event_data_object(
+                matrix,
+                load(os.path.join(path, 'dates.npy'), mmap_mode=mmap_mode),
+                load(os.path.join(path, 'sources.npy'), mmap_mode=mmap_mode)
+            )
+            if metadata['poisson_onesided'] is not None:
+                # The anomaly detectors are only fitted if rows have to be scored, on the rows they were fitted on
+                # when saved, see _get_anomaly_detector and _get_shard_detector
+                model._poisson_onesided = metadata['poisson_onesided']
+                model._num_of_fitted_rows = metadata.get('num_of_fitted_rows') or len(model._event_data_object)
+                if metadata['shard_by_class']:
+                    model._init_shards(model._num_of_fitted_rows)
+            if metadata['has_scores']:
+                model._scores = tuple(load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+                                      for name in ['devs', 'severities', 'expect'])
+
+        return model
+
+    def get_event(self, name):
+        '''
+        Returns the event with the given name in the event hierarchy, looked up in the model's hash index of event
+        names.
+
+        :param name: the name of an event.
+        :return: an EventHierarchyElement or None if no event has the name.
+        '''
+        node = self.find_node(name)
+        return None if node == -1 else self.node_elements_[node]
+
+    def expand(self, event=None, expansion=None):
+        '''
+        Expands an event into its children, itself and its ancestors, like expand_events, but without changing the
+        selected events of the model, so that several views can expand events of the same model concurrently.
+
+        :param event: an event in the event hierarchy, or None for expanding the root event.
+        :param expansion: an _EventExpansion that is reused for the result, or None for creating a new one.
+        :return: the _EventExpansion, where selected_index is the index of the expanded event.
+        '''
+        if expansion is None:
+            expansion = _EventExpansion()
+        self.expand_events_into(event, expansion)
+        if profiler.enabled:
+            profiler.count("swig.expand_events_into")
+        return expansion
+
+    @profiled("summarize_selected_events")
+    def summarize_selected_events(self, data_indexes, devs, expect, selected_event=None, expansion=None):
+        '''
+        Summarizes the children of each selected event (see expand_events) in many rows with a single call, in the
+        same way as summarize_event_children does for a single row and event.
+
+        :param data_indexes: the row indexes into the event data object.
+        :param devs: an array of size number of rows x number of components with the deviations of each row.
+        :param expect: an array with the expected values of each row, as returned by calc_one or calc_many.
+        :param selected_event: the index of the selected event, the children of the selected events before it are
+        summarized, while the selected event and the events after it are not, None means that none is summarized.
+        :param expansion: an _EventExpansion (see expand) with the events to summarize instead of the selected events.
+        :return: a tuple (maxdev, maxsev, count, expected, maxind) of arrays of size number of rows x number of
+        selected events.
+        '''
+        # Only the given rows are read from the data matrix, which may be sparse or memory mapped
+        data = ascontiguousarray(self._event_data_object.get_rows(asarray(data_indexes, dtype=int)), dtype=float)
+        rows = arange(len(data), dtype=int32)
+        devs = ascontiguousarray(devs, dtype=float).reshape(len(rows), -1)
+        expect = ascontiguousarray(expect, dtype=float).reshape(len(rows), -1)
+
+        shape = (len(rows), self.get_num_of_selected_events() if expansion is None else expansion.get_num_of_events())
+        maxdev = empty(shape)
+        maxsev = empty(shape, dtype=int32)
+        count = empty(shape, dtype=int32)
+        expected = empty(shape)
+        maxind = empty(shape, dtype=int32)
+
+        if not self.summarize_event_children_in_rows(rows, devs, devs.shape[1], expect, expect.shape[1], data, data.shape[1],
+                                                     expansion, 0 if selected_event is None else selected_event,
+                                                     maxdev, maxsev, count, expected, maxind):
+            raise RuntimeError("The selected events could not be summarized")
+        if profiler.enabled:
+            profiler.count("swig.summarize_event_children_in_rows")
+
+        return maxdev, maxsev, count, expected, maxind
+
     def summarize_event_anomalies(self, devs):
-        sevs = array([0.0]*get_global_num_of_severity_levels())
-        ele = self.get_event_hierarchy()
-        while ele is not None:
-            for i in range(get_global_num_of_severity_levels()):
-                if ele.get_index_value(i) != -1:
-                    if devs[ele.get_index_component(i)] > sevs[i]:
-                        sevs[i] = devs[ele.get_index_component(i)]
-            ele = ele.event_hierarchy_next();
-
-        return sevs
\ No newline at end of file
+        '''
+        Returns the maximum deviation (or 0.0) of each severity level.
+
+        :param devs: an array with the deviation of each component.
+        :return: an array with one value per severity level.
+        '''
+        return self._summarize_many(asarray(devs, dtype=float).reshape(1, -1))[0]
+
+    def _summarize_many(self, devs):
+        sevs = zeros((len(devs), self.num_of_severity_levels_))
+        for sev_lev_ind in xrange(self.num_of_severity_levels_):
+            components = self._severity_components[sev_lev_ind]
+            if len(components) > 0 and len(devs) > 0:
+                sevs[:, sev_lev_ind] = fmax(fmax.reduce(devs[:, components], axis=1), 0.0)
+        return sevs
@@ -4,16 +4,38 @@
 #
 # License: BSD 3 clause
 
+from numpy import unique, asarray, int32, int64, lexsort, searchsorted, arange, argsort, union1d, concatenate, zeros, \
+    diff, repeat, insert, bincount, cumsum, r_
+from scipy.sparse import issparse
+
 from pyisc import DataObject
 
-class EventDataObject(DataObject):
+
+def _get_sort_keys(source_codes, days):
+    '''
+    Returns an integer key of each row that is ordered first by source code and then by day.
+    '''
+    return (source_codes.astype(int64) << 32) + (days.astype(int64) + 2**31)
+
+
+class _EventRows(object):
+    '''
+    The rows of an event data object as kept in python, shared by EventDataObject and SparseEventDataObject.
+    '''
+
     '''
     The model that created this event data object.
     '''
     model_ = None
     '''
+    The data matrix with the aggregated event columns of the model. In an EventDataObject, it is the matrix given to
+    the C++ data object and it is placed in shared memory so that it can be shared with worker processes. In a
+    SparseEventDataObject, it is a scipy.sparse CSR matrix.
+    '''
+    matrix_ = None
+    '''
     The date column used by the model is explicitly kept here, since the support for date is better in python then
-    in the C++ data object.
+    in the C++ data object. It is a numpy.datetime64 array with a resolution of days.
     '''
     dates_ = None
     '''
@@ -21,3 +43,171 @@ class EventDataObject(DataObject):
     '''
     sources_ = None
 
+    '''
+    The sorted unique source names and, for each row, the index of its source in source_names_. Created by build_index.
+    '''
+    source_names_ = None
+    source_codes_ = None
+    '''
+    The date of each row as an integer number of days since 1970-01-01. Created by build_index.
+    '''
+    days_ = None
+
+    _row_order = None
+    _sorted_days = None
+    _source_starts = None
+
+    def build_index(self, previous=None):
+        '''
+        Builds an index of the rows partitioned by source and sorted by date, so that the rows of a source within
+        a period can be found by binary search. It must be rebuilt if dates_ or sources_ are changed.
+        :param previous: optional, an event data object with the first rows of this one and a built index, like the
+        event data object before rows were appended. Then, only the remaining rows are sorted and they are merged into
+        the index of previous.
+        :return:
+        '''
+        if previous is None or previous.source_names_ is None:
+            self.source_names_, self.source_codes_ = unique(self.sources_, return_inverse=True)
+            self.days_ = asarray(self.dates_).astype('datetime64[D]').astype(int32)
+            self._row_order = lexsort((self.days_, self.source_codes_))
+            self._sorted_days = self.days_[self._row_order]
+            self._source_starts = searchsorted(self.source_codes_[self._row_order], arange(len(self.source_names_)+1))
+            return
+
+        num_of_old_rows = len(previous.days_)
+        new_sources = asarray(self.sources_[num_of_old_rows:])
+        new_days = asarray(self.dates_[num_of_old_rows:]).astype('datetime64[D]').astype(int32)
+
+        self.source_names_ = union1d(previous.source_names_, new_sources)
+        old_codes = previous.source_codes_
+        source_counts = zeros(len(self.source_names_), dtype=int)
+        if len(self.source_names_) > len(previous.source_names_):
+            # New sources change the codes of the sources sorted after them
+            code_map = searchsorted(self.source_names_, previous.source_names_)
+            old_codes = code_map[old_codes]
+            source_counts[code_map] = diff(previous._source_starts)
+        else:
+            source_counts[:] = diff(previous._source_starts)
+        new_codes = searchsorted(self.source_names_, new_sources)
+        self.source_codes_ = concatenate([old_codes, new_codes])
+        self.days_ = concatenate([previous.days_, new_days])
+
+        # The new rows are inserted after the rows of the same source on the same or earlier days, as when sorted
+        # together, since their indexes are larger
+        new_order = lexsort((new_days, new_codes))
+        positions = searchsorted(
+            _get_sort_keys(repeat(arange(len(source_counts)), source_counts), previous._sorted_days),
+            _get_sort_keys(new_codes[new_order], new_days[new_order]),
+            'right'
+        )
+        self._row_order = insert(previous._row_order, positions, new_order + num_of_old_rows)
+        self._sorted_days = insert(previous._sorted_days, positions, new_days[new_order])
+        source_counts += bincount(new_codes, minlength=len(source_counts))
+        self._source_starts = r_[0, cumsum(source_counts)]
+
+    def get_window_indexes(self, source, first_day, last_day):
+        '''
+        Returns the row indexes of a source with a date in the period from first_day to last_day (inclusive).
+        :param source: index of the source in source_names_
+        :param first_day: the first day as an integer number of days since 1970-01-01
+        :param last_day: the last day as an integer number of days since 1970-01-01
+        :return: an array with row indexes sorted by date.
+        '''
+        if self._row_order is None:
+            self.build_index()
+        start = self._source_starts[source]
+        days = self._sorted_days[start:self._source_starts[source+1]]
+        return self._row_order[start+searchsorted(days, first_day, 'left'):start+searchsorted(days, last_day, 'right')]
+
+    def get_rows(self, rows):
+        '''
+        Returns rows of matrix_ as a dense float array.
+        :param rows: an array of row indexes or a slice.
+        :return: a 2D array
+        '''
+        values = self.matrix_[rows]
+        return values.toarray() if issparse(values) else asarray(values, dtype=float)
+
+    def get_column(self, column):
+        '''
+        Returns a column of matrix_ as a dense array.
+        :param column: a column index
+        :return: a 1D array
+        '''
+        values = self.matrix_[:, column]
+        return values.toarray().ravel() if issparse(values) else values
+
+
+class EventDataObject(_EventRows, DataObject):
+    '''
+    An event data object with all rows in a C++ data object, created by EventDataModel.data_object.
+    '''
+
+    def get_scoring_row(self, index):
+        '''
+        Returns the data object and the index within it that a row is scored with.
+        :param index: a row index
+        :return: a tuple (data object, index)
+        '''
+        return self, index
+
+    def get_scoring_batches(self, indices):
+        '''
+        Divides rows into batches that are each scored with one data object.
+        :param indices: an array of row indexes
+        :return: a generator of tuples (data object, positions in indices, indexes within the data object)
+        '''
+        indices = asarray(indices, dtype=int)
+        yield self, arange(len(indices)), indices
+
+
+class SparseEventDataObject(_EventRows):
+    '''
+    An event data object that keeps the aggregated data matrix as a scipy.sparse CSR matrix, created by
+    EventDataModel.data_object when given a sparse count matrix. The C++ data object only handles dense data, so the
+    rows that are scored are densified, at most chunk_size rows at a time.
+    '''
+
+    def __init__(self, matrix, class_column=None, chunk_size=1024):
+        '''
+        :param matrix: a scipy.sparse matrix with the aggregated event columns.
+        :param class_column: the index of the class column or None.
+        :param chunk_size: the maximum number of rows densified at a time.
+        :return:
+        '''
+        self.matrix_ = matrix.tocsr()
+        self.class_column = class_column
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return self.matrix_.shape[0]
+
+    def get_chunks(self):
+        '''
+        Iterates over all rows in dense chunks.
+        :return: a generator of EventDataObject
+        '''
+        for start in xrange(0, len(self), self.chunk_size):
+            yield EventDataObject(self.get_rows(slice(start, start + self.chunk_size)), class_column=self.class_column)
+
+    def get_scoring_row(self, index):
+        '''
+        Returns a dense data object with only the row, and the index of the row within it.
+        :param index: a row index
+        :return: a tuple (EventDataObject, 0)
+        '''
+        return EventDataObject(self.get_rows([index]), class_column=self.class_column), 0
+
+    def get_scoring_batches(self, indices):
+        '''
+        Divides rows into batches of at most chunk_size rows in increasing order, which are each densified into one
+        data object.
+        :param indices: an array of row indexes
+        :return: a generator of tuples (EventDataObject, positions in indices, indexes within the data object)
+        '''
+        indices = asarray(indices, dtype=int)
+        order = argsort(indices, kind='mergesort')
+        for start in xrange(0, len(indices), self.chunk_size):
+            positions = order[start:start + self.chunk_size]
+            data_object = EventDataObject(self.get_rows(indices[positions]), class_column=self.class_column)
+            yield data_object, positions, arange(len(positions))
@@ -0,0 +1,312 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+import logging
+import datetime
+from Queue import Queue
+from threading import Thread, Lock
+
+from numpy import array, arange, concatenate, repeat, tile, where, argmax, asarray, integer, datetime64, int64
+
+from visisc import EventDataModel, EventScoreCache, profiler, profiled
+
+__author__ = 'tol'
+
+_epoch_ordinal = datetime.date(1970, 1, 1).toordinal()
+
+def to_day_number(day):
+    '''
+    Converts a date to an integer number of days since 1970-01-01.
+    :param day: an integer (already a day number), a numpy.datetime64 or an instance of datetime.date
+    :return: an integer
+    '''
+    if isinstance(day, (int, long, integer)):
+        return int(day)
+    if isinstance(day, datetime64):
+        return int(day.astype('datetime64[D]').astype(int64))
+    return day.toordinal() - _epoch_ordinal
+
+
+def from_day_number(day):
+    '''
+    Converts a number of days since 1970-01-01 to a date.
+    :param day: an integer
+    :return: an instance of datetime.date
+    '''
+    return datetime.date.fromordinal(int(day) + _epoch_ordinal)
+
+
+class EventFrame(object):
+    '''
+    The bars and the labels of one frame of the visualization. Bar i is placed at (x[i], y[i]) with the height z[i]
+    and the severity level severities[i], where -1 means not anomalous.
+    '''
+
+    def __init__(self, x, y, z, severities, time_labels, source_labels, selected_event=None):
+        '''
+        :param x: an integer array with the source (or selected event) slot of each bar.
+        :param y: an integer array with the time slot of each bar, from 0 for the first day up to the number of days.
+        :param z: a float array with the event count of each bar.
+        :param severities: an integer array with the severity level of each bar or -1 if not anomalous.
+        :param time_labels: a list with a date string for each time slot.
+        :param source_labels: a list with the name of the source (or selected event) of each source slot.
+        :param selected_event: the index of the selected event among the selected events or None.
+        :return:
+        '''
+        self.x = x
+        self.y = y
+        self.z = z
+        self.severities = severities
+        self.time_labels = time_labels
+        self.source_labels = source_labels
+        self.selected_event = selected_event
+
+    def __len__(self):
+        return len(self.x)
+
+
+class EventFrameComputer(object):
+    '''
+    Computes the frames shown by the EventVisualization class, without depending on any rendering, so that frames
+    can be computed on machines without a display.
+    '''
+
+    def __init__(self, model, decision_threshold, cache=None):
+        '''
+        :param model: an instance of EventDataModel with an event data object and a fitted anomaly detector.
+        :param decision_threshold: a float larger or equal to 0.0 that is used for deciding when an anomaly score is
+        significantly anomalous.
+        :param cache: an instance of EventScoreCache used for caching the anomaly calculations, by default an
+        unbounded cache.
+        :return:
+        '''
+        assert isinstance(model, EventDataModel)
+        self.model = model
+        self.decision_threshold = decision_threshold
+        self.cache = EventScoreCache() if cache is None else cache
+        # Day number -> date string, the labels of the time axis
+        self._day_labels = {}
+
+        root = model.get_event_hierarchy()
+        self._root_columns = [root.get_index_value(l) for l in xrange(model.num_of_severity_levels_) if root.get_index_value(l) != -1]
+
+        self.set_data(model._event_data_object)
+
+    def set_data(self, data):
+        '''
+        Sets the event data object that frames are computed for and builds its source and date index, unless already
+        built, like by EventDataModel.append.
+        :param data: an instance of EventDataObject
+        :return:
+        '''
+        self.data = data
+        if data.source_names_ is None:
+            data.build_index()
+        self.source_names = list(data.source_names_)
+        self.num_of_sources = len(self.source_names)
+
+    def get_scores(self, data_index, details=None):
+        '''
+        Returns the cached anomaly calculations for a data row, they are computed and cached if not already cached.
+        :param data_index:
+        :param details: optional, already computed anomaly details for the row as returned by EventDataModel.calc_one
+        :return: a tuple (devs, sevs, expect, min2, max2, count)
+        '''
+        entry = self.cache.get(data_index)
+        if entry is None:
+            entry = self.put_scores(data_index, self.model.calc_one(data_index) if details is None else details)
+        return entry
+
+    def put_scores(self, data_index, details):
+        '''
+        Caches the anomaly calculations for a data row.
+        :param data_index:
+        :param details: the anomaly details for the row as returned by EventDataModel.calc_one
+        :return: a tuple (devs, sevs, expect, min2, max2, count)
+        '''
+        devs, sevs, expect, min2, max2 = details
+
+        count = self.data.matrix_[data_index, self._root_columns].sum()
+
+        entry = (asarray(devs, dtype=float), sevs, asarray(expect, dtype=float), min2, max2, count)
+        # The size of the arrays plus a rough estimate of the overhead.
+        self.cache.put(data_index, entry, 8*(len(devs)+len(expect)+len(sevs)) + 512)
+        return entry
+
+    def get_uncached_rows(self, first_day, last_day, selected_source=None):
+        '''
+        Returns the rows shown in a window that have no cached anomaly calculations.
+        :param first_day: the first day of the window as a day number.
+        :param last_day: the last day of the window as a day number.
+        :param selected_source: index of a source in source_names, or None for all sources.
+        :return: a list with row indexes.
+        '''
+        sources = xrange(self.num_of_sources) if selected_source is None else [selected_source]
+        return [int(data_index) for source in sources
+                for data_index in self.data.get_window_indexes(source, first_day, last_day)
+                if data_index not in self.cache]
+
+    def _get_day_label(self, day):
+        label = self._day_labels.get(day)
+        if label is None:
+            label = self._day_labels[day] = from_day_number(day).isoformat()
+        return label
+
+    @profiled("compute_frame")
+    def compute_frame(self, current_time, num_of_days, selected_source=None, selected_event=None, expansion=None):
+        '''
+        Computes the bars and labels of a frame.
+
+        :param current_time: the last shown day, an instance of datetime.date, a numpy.datetime64 or a day number.
+        :param num_of_days: the number of days shown before current_time.
+        :param selected_source: index of a source in source_names, or None for showing the total event count of all
+        sources.
+        :param selected_event: index of the selected event among the model's selected events (as returned by
+        EventDataModel.expand_events), used when a source is selected.
+        :param expansion: an _EventExpansion (see EventDataModel.expand) with the events shown when a source is selected,
+        or None for using the model's selected events.
+        :return: an instance of EventFrame
+        '''
+        last_day = to_day_number(current_time)
+        first_day = last_day - num_of_days
+
+        if selected_source is None: # All sources
+            window_indexes = [self.data.get_window_indexes(source, first_day, last_day) for source in xrange(self.num_of_sources)]
+            data_indexes = concatenate(window_indexes)
+            self.cache.protect(data_indexes)
+
+            x = repeat(arange(self.num_of_sources), [len(indexes) for indexes in window_indexes])
+            z = []
+            severities = []
+            for data_index in data_indexes:
+                devs, sevs, expect, min2, max2, count = self.get_scores(data_index)
+                z.append(count)
+
+                sev_max = argmax(sevs)
+                severities.append(-1 if sevs[sev_max] < self.decision_threshold else sev_max)
+
+            y = num_of_days - (last_day - self.data.days_[data_indexes])
+            source_labels = list(self.source_names)
+        else: # Selected events of a selected source
+            data_indexes = self.data.get_window_indexes(selected_source, first_day, last_day)
+            self.cache.protect(data_indexes)
+
+            if expansion is None:
+                num_of_events = self.model.get_num_of_selected_events()
+                get_event = self.model.get_selected_event
+            else:
+                num_of_events = expansion.get_num_of_events()
+                get_event = expansion.get_event
+
+            if len(data_indexes) > 0 and num_of_events > 0:
+                entries = [self.get_scores(data_index) for data_index in data_indexes]
+                maxdev, maxsev, count, _, _ = self.model.summarize_selected_events(
+                    data_indexes,
+                    array([entry[0] for entry in entries]),
+                    array([entry[2] for entry in entries]),
+                    selected_event,
+                    expansion
+                )
+                x = tile(arange(num_of_events), len(data_indexes))
+                y = repeat(num_of_days - (last_day - self.data.days_[data_indexes]), num_of_events)
+                z = count.ravel()
+                severities = where(maxdev < self.decision_threshold, -1, maxsev).ravel()
+            else:
+                x = y = z = severities = []
+
+            source_labels = [get_event(element).name for element in xrange(num_of_events)]
+
+        time_labels = [self._get_day_label(day) for day in xrange(first_day, last_day+1)]
+
+        return EventFrame(array(x, dtype=int), array(y, dtype=int), array(z, dtype=float), array(severities, dtype=int),
+                          time_labels, source_labels, selected_event)
+
+
+class EventFramePrefetcher(object):
+    '''
+    Computes the anomaly calculations of the rows in upcoming windows in a background thread and puts them in the
+    cache of an EventFrameComputer, so that moving the window, like during playback, does not have to wait for rows
+    to be scored. The rows are scored in batches of batch_size rows, and the model only holds its scoring lock during
+    a batch, so rows of the shown window can be scored in between.
+    '''
+
+    def __init__(self, frames, batch_size=32):
+        '''
+        :param frames: an instance of EventFrameComputer
+        :param batch_size: the number of rows scored at a time.
+        :return:
+        '''
+        self.frames = frames
+        self.batch_size = batch_size
+        self._requests = Queue()
+        # Incremented by each request, so that the worker stops working on an older request
+        self._generation = 0
+        # Held by the worker while it scores a batch, see cancel
+        self._batch_lock = Lock()
+        self._thread = None
+
+    def prefetch(self, windows, selected_source=None):
+        '''
+        Requests that the rows of windows are scored, replacing any unfinished request.
+        :param windows: a list of tuples (first day, last day) with day numbers, in the order they will be shown.
+        :param selected_source: index of a source in source_names of the frame computer, or None for all sources.
+        :return:
+        '''
+        self._generation += 1
+        self._requests.put((self._generation, windows, selected_source))
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name="EventFramePrefetcher")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def cancel(self):
+        '''
+        Stops the work on the current request and waits until the batch being scored, if any, is done, so that
+        nothing is scored or cached by the worker after it returns.
+        :return:
+        '''
+        self._generation += 1
+        with self._batch_lock:
+            pass
+
+    def stop(self):
+        '''
+        Stops the background thread.
+        :return:
+        '''
+        self.cancel()
+        if self._thread is not None:
+            self._requests.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            generation, windows, selected_source = request
+            try:
+                for first_day, last_day in windows:
+                    with self._batch_lock:
+                        if generation != self._generation:
+                            break
+                        rows = self.frames.get_uncached_rows(first_day, last_day, selected_source)
+                    for start in xrange(0, len(rows), self.batch_size):
+                        if generation != self._generation:
+                            break
+                        with self._batch_lock:
+                            if generation != self._generation:
+                                break
+                            batch = rows[start:start+self.batch_size]
+                            with profiler.timer("prefetch"):
+                                devs, sevs, expect = self.frames.model.calc_many(batch)
+                            for i in xrange(len(batch)):
+                                if generation != self._generation:
+                                    break
+                                self.frames.put_scores(batch[i], (devs[i], sevs[i], expect[i], None, None))
+            except Exception:
+                logging.getLogger("visisc").exception("Prefetching of anomaly scores failed")
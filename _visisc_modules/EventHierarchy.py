@@ -15,6 +15,7 @@ class EventHierarchyElement(_EventHierEle):
     child_ = None
     sibling_ = None
     parent_ = None
+    last_child_ = None
     num_of_children = 0
     def __init__(self, name):
         '''
@@ -48,7 +49,7 @@ class EventHierarchyElement(_EventHierEle):
 
     def add_child(self,element):
         '''
-        Extends a parent with a child node.
+        Extends a parent with a child node, the child is added after the last child in constant time.
         :param element:
         :return:
         '''
@@ -59,38 +60,34 @@ class EventHierarchyElement(_EventHierEle):
             self.child_ = element
             self.child = element
         else:
-            self.child_._add_sibling(element)
+            self.last_child_.sibling_ = element
+            self.last_child_.sibling = element
+        self.last_child_ = element
 
     def remove_child(self,element):
-        if self.child_ is None:
+        previous = None
+        current = self.child_
+        while current is not None and current != element:
+            previous = current
+            current = current.sibling_
+
+        if current is None:
             return
 
-        if self.child_ == element:
-            element.parent = None
-            element.parent_ = None
-            self.child_ = self.child_.sibling_
-            self.child = self.child.sibling
-            self.num_of_children -= 1
+        if previous is None:
+            self.child_ = element.sibling_
+            self.child = element.sibling
         else:
-            self.child._remove_sibling(element)
-
+            previous.sibling_ = element.sibling_
+            previous.sibling = element.sibling
+        if self.last_child_ == element:
+            self.last_child_ = previous
 
-    def _add_sibling(self,element):
-        if self.sibling_ is None:
-            self.sibling_ = element
-            self.sibling = element
-        else:
-            self.sibling_._add_sibling(element)
-
-    def _remove_sibling(self,element):
-        if self.sibling_ == element:
-            element.parent = None
-            element.parent_ = None
-            self.sibling_ = self.sibling_.sibling_
-            self.sibling = self.sibling.sibling
-            self.parent.num_of_children -= 1
-        else:
-            self.sibling_._remove_sibling(element)
+        element.parent = None
+        element.parent_ = None
+        element.sibling_ = None
+        element.sibling = None
+        self.num_of_children -= 1
 
     def to_string(self, level=0):
         '''
@@ -98,18 +95,18 @@ class EventHierarchyElement(_EventHierEle):
         :param level:
         :return:
         '''
-        str = (" "*level) + self.name
-        if self.child_ is not None:
-            str += ":\n"
-            str += self.child_.to_string(level+1)
-
-
-        if self.sibling_ is not None:
-            str += "\n"
-            str += self.sibling_.to_string(level)
-
-
-        return str
+        lines = []
+        stack = [(self, level)]
+        while len(stack) > 0:
+            ele, level = stack.pop()
+            lines.append((" "*level) + ele.name + (":" if ele.child_ is not None else ""))
+            # The child is popped before the sibling
+            if ele.sibling_ is not None:
+                stack.append((ele.sibling_, level))
+            if ele.child_ is not None:
+                stack.append((ele.child_, level+1))
+
+        return "\n".join(lines)
 
     def next(self):
         '''
@@ -125,6 +122,42 @@ class EventHierarchyElement(_EventHierEle):
         return ele.sibling_
 
 
+    @classmethod
+    def from_paths(cls, paths, severities=None, sep='.', root_name="Root"):
+        '''
+        Creates a whole event hierarchy from a list of event paths in one pass. Each path element is an event named by
+        the path up to and including the element, separated by sep and beginning with root_name. The index value of
+        an event for a severity level is set to the index in paths of the first path that goes through the event with
+        that severity level, like the root and the events of the first path are set to 0.
+
+        The global number of severity levels must be set before calling this method.
+
+        :param paths: a list of paths, where each path is a list of strings.
+        :param severities: a list with the severity level of each path, by default 0 for all paths.
+        :param sep: a string that is put in between the path elements to form event names.
+        :param root_name: the name of the root event.
+        :return: the root of the event hierarchy.
+        '''
+        root = cls(root_name)
+        events = {root_name: root}
+        for i in xrange(len(paths)):
+            severity_level = severities[i] if severities is not None else 0
+            if root.get_index_value(severity_level) == -1:
+                root.set_index_value(severity_level, i)
+            parent = root
+            path = root_name
+            for element in paths[i]:
+                path = str(path + sep + element)
+                event = events.get(path)
+                if event is None:
+                    event = cls(path)
+                    events[path] = event
+                    parent.add_child(event)
+                if event.get_index_value(severity_level) == -1:
+                    event.set_index_value(severity_level, i)
+                parent = event
+        return root
+
     def __str__(self):
         return self.to_string()
 
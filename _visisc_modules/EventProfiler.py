@@ -0,0 +1,190 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+import time
+import logging
+from functools import wraps
+
+__author__ = 'tol'
+
+_logger = logging.getLogger("visisc.profile")
+
+
+class _Timer(object):
+    __slots__ = ('_profiler', '_name', '_start')
+
+    def __init__(self, profiler, name):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._profiler.add_time(self._name, time.time() - self._start)
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+_null_timer = _NullTimer()
+
+
+class EventProfiler(object):
+    '''
+    Named timers and counters for the hot paths of the event data model and the visualization. It is disabled by
+    default, and then a timer is a shared no-op and counting is skipped by the callers, so the instrumentation costs
+    close to nothing. The instance used by visisc is visisc.profiler:
+
+        visisc.profiler.enable(log_frames=True)
+        ...
+        print visisc.profiler.report()
+
+    The timers are named by the instrumented stage, like "calc_one" or "update.render", and the counters count events
+    like "cache.hits" or calls into the C++ extension, like "swig.anomaly_score_details".
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        # Whether a breakdown of each frame of the visualization is logged to the logger "visisc.profile"
+        self.log_frames = False
+        # The timer and counter deltas of the last frame, see begin_frame and end_frame
+        self.last_frame = None
+        self._timers = {} # Name -> [number of calls, total seconds, max seconds]
+        self._counters = {} # Name -> count
+        self._frame_start = None
+
+    def enable(self, log_frames=False):
+        '''
+        Enables the timers and counters.
+        :param log_frames: boolean that indicates whether a breakdown of each frame is logged (at level INFO).
+        :return:
+        '''
+        self.enabled = True
+        self.log_frames = log_frames
+
+    def disable(self):
+        self.enabled = False
+        self.log_frames = False
+
+    def reset(self):
+        '''
+        Clears all timers and counters.
+        :return:
+        '''
+        self._timers = {}
+        self._counters = {}
+        self.last_frame = None
+        self._frame_start = None
+
+    def timer(self, name):
+        '''
+        Returns a context manager that adds the time spent in its with statement to the timer name.
+        :param name:
+        :return:
+        '''
+        return _Timer(self, name) if self.enabled else _null_timer
+
+    def add_time(self, name, seconds):
+        timer = self._timers.get(name)
+        if timer is None:
+            self._timers[name] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+
+    def count(self, name, n=1):
+        '''
+        Adds n to the counter name, callers check enabled first in hot paths.
+        :param name:
+        :param n:
+        :return:
+        '''
+        self._counters[name] = self._counters.get(name, 0) + n
+
+    def get_statistics(self):
+        '''
+        :return: a dictionary with the timers, as dictionaries with the number of calls and the total and maximum
+        seconds, and the counters.
+        '''
+        return {
+            'timers': dict((name, {'calls': calls, 'seconds': seconds, 'max_seconds': max_seconds})
+                           for name, (calls, seconds, max_seconds) in self._timers.items()),
+            'counters': dict(self._counters)
+        }
+
+    def begin_frame(self):
+        '''
+        Marks the start of a frame, the timers and counters of the frame are the changes until end_frame is called.
+        :return:
+        '''
+        if self.enabled:
+            self._frame_start = (dict((name, timer[1]) for name, timer in self._timers.items()), dict(self._counters))
+
+    def end_frame(self):
+        '''
+        Marks the end of a frame and logs its breakdown if log_frames is set.
+        :return: a dictionary with the seconds of each timer and the count of each counter during the frame, or None
+        if disabled.
+        '''
+        if not self.enabled or self._frame_start is None:
+            return None
+        seconds, counters = self._frame_start
+        self.last_frame = {
+            'timers': dict((name, timer[1] - seconds.get(name, 0.0)) for name, timer in self._timers.items()
+                           if timer[1] != seconds.get(name, 0.0)),
+            'counters': dict((name, count - counters.get(name, 0)) for name, count in self._counters.items()
+                             if count != counters.get(name, 0))
+        }
+        self._frame_start = None
+        if self.log_frames:
+            _logger.info("frame: %s", self._format(self.last_frame))
+        return self.last_frame
+
+    def report(self):
+        '''
+        :return: a string with one line per timer, sorted by total time, followed by one line per counter.
+        '''
+        lines = ["%-40s %8s %12s %12s" % ("timer", "calls", "seconds", "max seconds")]
+        for name, (calls, seconds, max_seconds) in sorted(self._timers.items(), key=lambda item: -item[1][1]):
+            lines.append("%-40s %8i %12.6f %12.6f" % (name, calls, seconds, max_seconds))
+        lines.append("%-40s %8s" % ("counter", "count"))
+        for name, count in sorted(self._counters.items()):
+            lines.append("%-40s %8i" % (name, count))
+        return "\n".join(lines)
+
+    def _format(self, frame):
+        return ", ".join(["%s %.4f s" % item for item in sorted(frame['timers'].items())] +
+                         ["%s %i" % item for item in sorted(frame['counters'].items())])
+
+
+profiler = EventProfiler()
+
+
+def profiled(name):
+    '''
+    A decorator that adds the time of each call of the decorated function to the timer name of profiler.
+    :param name:
+    :return:
+    '''
+    def decorate(function):
+        @wraps(function)
+        def profiled_function(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            with _Timer(profiler, name):
+                return function(*args, **kwargs)
+        return profiled_function
+    return decorate
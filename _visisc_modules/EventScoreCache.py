@@ -0,0 +1,138 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+from collections import OrderedDict
+from threading import RLock
+
+from visisc import profiler
+
+__author__ = 'tol'
+
+
+class EventScoreCache(object):
+    '''
+    A least recently used cache for anomaly scores of data rows, bounded by number of entries and/or number of bytes.
+    Lookup, insertion and eviction are O(1) (amortized). Rows that are protected, i.e. rows in the currently shown
+    window, are not evicted. It is thread safe, so that it can be filled by a background thread, see
+    EventFramePrefetcher.
+    '''
+
+    def __init__(self, max_bytes=None, max_entries=None):
+        '''
+        :param max_bytes: maximum total size in bytes of the cached entries, None for no limit.
+        :param max_entries: maximum number of cached entries, None for no limit.
+        :return:
+        '''
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.size_in_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # Key -> (value, size in bytes), least recently used first
+        self._protected = frozenset()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def get(self, key, default=None):
+        '''
+        Returns the cached value of key and marks it as most recently used, or returns default if not cached.
+        :param key:
+        :param default:
+        :return:
+        '''
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                if profiler.enabled:
+                    profiler.count("cache.misses")
+                return default
+            self._entries[key] = entry
+            self.hits += 1
+            if profiler.enabled:
+                profiler.count("cache.hits")
+            return entry[0]
+
+    def put(self, key, value, size_in_bytes=0):
+        '''
+        Caches value as the most recently used entry and evicts the least recently used unprotected entries until
+        the cache is within its limits.
+        :param key:
+        :param value:
+        :param size_in_bytes: the (estimated) memory used by value.
+        :return:
+        '''
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.size_in_bytes -= old_entry[1]
+            self._entries[key] = (value, size_in_bytes)
+            self.size_in_bytes += size_in_bytes
+            self._evict()
+
+    def protect(self, keys):
+        '''
+        Sets the keys that must not be evicted, replacing any previously protected keys.
+        :param keys: an iterable of keys, for instance the rows in the currently shown window.
+        :return:
+        '''
+        protected = frozenset(keys)
+        with self._lock:
+            self._protected = protected
+
+    def invalidate(self, keys=None):
+        '''
+        Removes the given keys from the cache, or all entries if keys is None.
+        :param keys:
+        :return:
+        '''
+        with self._lock:
+            if keys is None:
+                self._entries.clear()
+                self.size_in_bytes = 0
+                return
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self.size_in_bytes -= entry[1]
+
+    def get_statistics(self):
+        '''
+        :return: a dictionary with the current size and the hit, miss and eviction counters of the cache.
+        '''
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_in_bytes': self.size_in_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def _is_full(self):
+        return (self.max_entries is not None and len(self._entries) > self.max_entries) or \
+               (self.max_bytes is not None and self.size_in_bytes > self.max_bytes)
+
+    def _evict(self):
+        # Protected entries are moved to the most recently used end, so each one is skipped at most once.
+        num_of_skipped = 0
+        while self._is_full() and num_of_skipped < len(self._entries):
+            key, entry = self._entries.popitem(last=False)
+            if key in self._protected:
+                self._entries[key] = entry
+                num_of_skipped += 1
+            else:
+                self.size_in_bytes -= entry[1]
+                self.evictions += 1
+                if profiler.enabled:
+                    profiler.count("cache.evictions")
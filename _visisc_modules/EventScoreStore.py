@@ -0,0 +1,191 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+import os
+import tempfile
+from threading import RLock
+
+from numpy import asarray, uint8, uint64, float64, nonzero, zeros, dtype, where
+from numpy.lib.format import open_memmap
+
+__author__ = 'tol'
+
+
+class EventScoreStore(object):
+    '''
+    An on-disk store of the anomaly details of the rows of an event data object, see EventDataModel.use_score_store.
+    The deviations, severities and expected values of a row are kept in one record of a memory mapped .npy file in a
+    subdirectory named by a fingerprint of the model and its anomaly detector, so that visualizations and batch jobs
+    using the same model share the computed rows, and processes on the same machine share one copy in the page cache.
+
+    Each record also holds a key of the values of its row, and a record is only used for a row with the same key, so
+    the store stays valid when rows are appended to the event data object without changing the anomaly detector.
+
+    The methods can be called from several threads, like the threads of an EventVisualization and its
+    EventFramePrefetcher.
+    '''
+
+    def __init__(self, directory, fingerprint, num_of_rows):
+        '''
+        :param directory: the directory where the stores of all models are kept, it is created if it does not exist.
+        :param fingerprint: a string that identifies the model and its anomaly detector, see
+        EventDataModel.get_fingerprint.
+        :param num_of_rows: the number of rows in the event data object.
+        :return:
+        '''
+        self.path = os.path.join(directory, fingerprint)
+        self.num_of_rows = num_of_rows
+        try:
+            os.makedirs(self.path)
+        except OSError:
+            if not os.path.isdir(self.path):
+                raise
+
+        self._filename = os.path.join(self.path, 'rows.npy')
+        # The records of the rows, created when the first rows are stored, since the number of components is not
+        # known before, see _open_rows.
+        self.rows_ = None
+        self._inode = None
+        # Held while the records are read or written, since they are reopened and replaced by _open_rows
+        self._lock = RLock()
+        with self._lock:
+            self._open_rows()
+
+    def __len__(self):
+        return self.num_of_rows
+
+    def set_num_of_rows(self, num_of_rows):
+        '''
+        Sets the number of rows, when rows have been appended to the event data object, the file is grown when the
+        first appended rows are stored.
+        :param num_of_rows: the number of rows in the event data object.
+        :return:
+        '''
+        with self._lock:
+            self.num_of_rows = num_of_rows
+
+    def contains(self, indices, keys):
+        '''
+        :param indices: an array of row indexes.
+        :param keys: an array with a key of the values of each row, like a hash.
+        :return: a boolean array that is true for the rows that are stored.
+        '''
+        indices = asarray(indices, dtype=int)
+        stored = zeros(len(indices), dtype=bool)
+        with self._lock:
+            self._open_rows()
+            if self.rows_ is None:
+                return stored
+            # Another process may have created the file for fewer rows
+            inside = indices < len(self.rows_)
+            rows = self.rows_[indices[inside]]
+        stored[inside] = (rows['computed'] != 0) & (rows['key'] == asarray(keys, dtype=uint64)[inside])
+        return stored
+
+    def get_missing(self, indices, keys):
+        '''
+        :param indices: an array of row indexes.
+        :param keys: an array with the key of each row.
+        :return: the row indexes that are not stored.
+        '''
+        indices = asarray(indices, dtype=int)
+        return indices[nonzero(~self.contains(indices, keys))[0]]
+
+    def get_many(self, indices, keys):
+        '''
+        Returns the stored anomaly details of rows, which have been stored with put_many. A stored row can still be
+        missing if another process replaced the file after it was stored, see _open_rows.
+        :param indices: an array of row indexes.
+        :param keys: an array with the key of each row.
+        :return: a tuple (devs, severities, expect, stored) of arrays with one row per index, where stored is true for
+        the rows that are stored, the anomaly details of the other rows are undefined.
+        '''
+        indices = asarray(indices, dtype=int)
+        with self._lock:
+            self._open_rows()
+            if self.rows_ is None:
+                raise ValueError("No rows are stored")
+            inside = indices < len(self.rows_)
+            rows = self.rows_[where(inside, indices, 0)]
+        stored = inside & (rows['computed'] != 0) & (rows['key'] == asarray(keys, dtype=uint64))
+        return rows['devs'], rows['severities'], rows['expect'], stored
+
+    def put_many(self, indices, keys, devs, severities, expect):
+        '''
+        Stores the anomaly details of rows, as returned by EventDataModel.calc_many. The rows are marked as stored
+        after their values are written, so other processes never read partially written rows.
+        :param indices: an array of row indexes.
+        :param keys: an array with the key of each row.
+        :param devs:
+        :param severities:
+        :param expect:
+        :return:
+        '''
+        indices = asarray(indices, dtype=int)
+        with self._lock:
+            self._open_rows(devs.shape[1], severities.shape[1], expect.shape[1])
+
+            self.rows_['computed'][indices] = 0
+            self.rows_['key'][indices] = keys
+            self.rows_['devs'][indices] = devs
+            self.rows_['severities'][indices] = severities
+            self.rows_['expect'][indices] = expect
+            self.rows_['computed'][indices] = 1
+
+    def flush(self):
+        '''
+        Writes the stored rows to disk.
+        :return:
+        '''
+        with self._lock:
+            if self.rows_ is not None:
+                self.rows_.flush()
+
+    def _open_rows(self, num_of_devs=None, num_of_severities=None, num_of_expect=None):
+        '''
+        Memory maps the stored records, which are reopened if another process has created or replaced the file. If
+        the file does not exist or has less than num_of_rows records, it is created or grown if the number of
+        components is given. It must be called with _lock held.
+        '''
+        if os.path.exists(self._filename):
+            inode = os.stat(self._filename).st_ino
+            if inode != self._inode:
+                self.rows_ = open_memmap(self._filename, mode='r+')
+                self._inode = inode
+        if self.rows_ is not None and len(self.rows_) >= self.num_of_rows:
+            return
+        if num_of_devs is None:
+            return
+
+        # The records are written under a temporary name, so that other processes never open a partially written
+        # file. Records stored by other processes during the copying are lost and have to be computed again. A grown
+        # file gets room for a quarter more rows, so that the records are not copied each time a day is appended.
+        num_of_records = self.num_of_rows if self.rows_ is None else max(self.num_of_rows, len(self.rows_)*5//4)
+        row_dtype = self.rows_.dtype if self.rows_ is not None else dtype([
+            ('computed', uint8),
+            ('key', uint64),
+            ('devs', float64, (num_of_devs,)),
+            ('severities', float64, (num_of_severities,)),
+            ('expect', float64, (num_of_expect,))
+        ])
+        fd, tmp_filename = tempfile.mkstemp(suffix='.npy', dir=self.path)
+        os.close(fd)
+        try:
+            rows = open_memmap(tmp_filename, mode='w+', dtype=row_dtype, shape=(num_of_records,))
+            if self.rows_ is not None:
+                rows[:len(self.rows_)] = self.rows_
+            rows.flush()
+            del rows
+            # The old records are unmapped before the file is replaced, which is required on Windows
+            self.rows_ = None
+            if os.name == 'nt' and os.path.exists(self._filename):
+                os.remove(self._filename)
+            os.rename(tmp_filename, self._filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+        self.rows_ = open_memmap(self._filename, mode='r+')
+        self._inode = os.stat(self._filename).st_ino
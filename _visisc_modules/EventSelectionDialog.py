@@ -5,8 +5,9 @@
 # License: BSD 3 clause
 
 import sys
+from pyface.gui import GUI
 from traits.has_traits import HasTraits
-from traits.trait_types import String, Button, DelegatesTo, Instance
+from traits.trait_types import String, Button, DelegatesTo, Instance, Int
 from traitsui.api import View, Item
 from traitsui.editors.check_list_editor import CheckListEditor
 from traitsui.editors.history_editor import HistoryEditor
@@ -18,6 +19,67 @@ from traitsui.item import Spring
 from visisc import EventSelectionQuery
 
 
+def _search_term_to_regex(term):
+    return term.replace(".", "\\.").replace("*", ".*").replace("?", ".?")
+
+
+class _EventNameIndex(object):
+    '''
+    A trigram index of event names for the search of EventSelectionDialog. The names that can match a search term are
+    found by intersecting the names with the trigrams of the literal parts of the term, and only those names are
+    matched by the compiled regular expression of all terms. The result of the last search is kept, so that a search
+    where each term extends a term of the last search only has to match the last result.
+    '''
+
+    def __init__(self, names):
+        self.names = names
+        self._trigrams = {}
+        for position, name in enumerate(names):
+            for i in xrange(len(name)-2):
+                self._trigrams.setdefault(name[i:i+3], set()).add(position)
+        self._last_terms = None
+        self._last_result = None
+
+    def search(self, terms):
+        '''
+        :param terms: a list of search terms, see EventSelectionDialog.help_text, a name matches if it matches any term.
+        :return: a list with the positions of the matching names in increasing order.
+        '''
+        if len(terms) == 0:
+            terms = [""]
+
+        if self._last_terms is not None and all(any(last in term for last in self._last_terms) for term in terms):
+            # Each term is at least as specific as a term of the last search
+            candidates = self._last_result
+        else:
+            candidates = set()
+            for term in terms:
+                term_candidates = self._get_candidates(term)
+                if term_candidates is None:
+                    candidates = None
+                    break
+                candidates |= term_candidates
+            candidates = xrange(len(self.names)) if candidates is None else sorted(candidates)
+
+        regex = re.compile("|".join("(?:%s)" % _search_term_to_regex(term) for term in terms))
+        result = [position for position in candidates if regex.search(self.names[position]) is not None]
+
+        self._last_terms = terms
+        self._last_result = result
+        return result
+
+    def _get_candidates(self, term):
+        '''
+        Returns the positions of the names that contain all trigrams of the literal parts of term, or None if the term
+        has no trigrams.
+        '''
+        trigrams = set(part[i:i+3] for part in re.split("[\\*\\?\\^\\$]", term) for i in xrange(len(part)-2))
+        if len(trigrams) == 0:
+            return None
+        postings = sorted((self._trigrams.get(trigram, set()) for trigram in trigrams), key=len)
+        return postings[0].intersection(*postings[1:])
+
+
 class EventSelectionDialog(HasTraits):
     source_class_label = String("Select Event Source Classes")
     severity_level_label = String("Select Event Severity Levels")
@@ -37,6 +99,11 @@ class EventSelectionDialog(HasTraits):
 
     query_object = Instance(EventSelectionQuery)
 
+    # The delay in milliseconds from the last change of the search until the event names are searched
+    search_delay = Int(200)
+    # The maximum number of matching event names that are shown
+    max_shown_event_names = Int(1000)
+
     spring = Spring
 
     help_text = ("Search engine like queries using alphanumeric characters and '_'and '.' \n" +
@@ -93,40 +160,54 @@ class EventSelectionDialog(HasTraits):
         '''
         assert isinstance(query_object, EventSelectionQuery)
 
-        self.shown_event_names_list = "\n".join(list(query_object.list_of_event_names))
         self.query_object = query_object
         self.query_start_date = query_object.period_start_date
         self.query_end_date = query_object.period_end_date
+        self._name_index = None
+        self._searched_query = None
+        self._search_generation = 0
 
         HasTraits.__init__(self,**kwargs)
 
+        self._show_event_names(list(query_object.list_of_event_names))
+
     def _search_changed(self):
         '''
-        Matches search query to the event names.
+        Searches the event names when the search has not been changed for search_delay milliseconds.
         :return:
         '''
-        query_st = str(self.search).strip()
+        self._search_generation += 1
+        GUI.invoke_after(self.search_delay, self._update_search, self._search_generation)
 
-        if re.match("^[_a-zA-Z0-9\*\.\$\^\?\s]*$", query_st) is None:
+    def _update_search(self, generation=None):
+        '''
+        Matches search query to the event names.
+        :param generation: the search generation the update was scheduled for, or None for updating now.
+        :return:
+        '''
+        if generation is not None and generation != self._search_generation:
             return
 
-        query_st = query_st.replace(".", "\.")
-        query_st = query_st.replace("*", ".*")
-        query_st = query_st.replace("?", ".?")
-        queries = query_st.split()
+        query_st = str(self.search).strip()
 
-        print self.search, query_st, queries,
+        if re.match("^[_a-zA-Z0-9\*\.\$\^\?\s]*$", query_st) is None or query_st == self._searched_query:
+            return
+        self._searched_query = query_st
 
-        if len(queries) == 0:
-            queries = [""]
+        names = self.query_object.list_of_event_names
+        if self._name_index is None or self._name_index.names is not names:
+            self._name_index = _EventNameIndex(names)
 
-        result = [s for s in list(self.query_object.list_of_event_names) for q in queries if
-                  re.search((".*%s.*" % q), s) is not None]
+        result = [names[position] for position in self._name_index.search(query_st.split())]
 
         self.query_object.selected_list_of_event_names = result
-        self.shown_event_names_list = "\n".join(result)
+        self._show_event_names(result)
 
-        print len(self.shown_event_names_list)
+    def _show_event_names(self, names):
+        shown = names[:self.max_shown_event_names]
+        if len(names) > len(shown):
+            shown.append("... %i more" % (len(names) - len(shown)))
+        self.shown_event_names_list = "\n".join(shown)
 
     def _save_search(self):
         # A bug fix, stops the clearing of the search expression
@@ -134,7 +215,8 @@ class EventSelectionDialog(HasTraits):
         self.search = " "
         self.search = tmp
 
-        print len(self.query_object.selected_list_of_event_names)
+        # The query must use the current search, even if its delayed update has not been run yet
+        self._update_search()
 
     def _query_button_changed(self):
         self._save_search()
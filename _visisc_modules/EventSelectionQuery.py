@@ -6,9 +6,12 @@
 
 from abc import abstractmethod
 
+from numpy import asarray, unique, argsort, searchsorted, in1d, sort, datetime64, int32, array
 from traits.has_traits import HasTraits
 from traits.trait_types import Date, List
 
+from _visisc_modules.EventDataModel import _get_column
+
 
 class EventSelectionQuery(HasTraits):
     period_start_date = Date
@@ -35,4 +38,151 @@ class EventSelectionQuery(HasTraits):
         on what can be done in subclasses. See http://docs.enthought.com/traits/traits_user_manual/front.html
         :return:
         '''
-        pass
\ No newline at end of file
+        pass
+
+
+class IndexedEventSelectionQuery(EventSelectionQuery):
+    '''
+    An event selection query that keeps the raw event data together with indexes of its rows by source, class and
+    date and of its event columns by name and severity level, so that a selection is answered by binary search and
+    vectorized masks instead of by testing every row. execute_query creates an EventDataModel of the selected rows
+    and events and shows it in an EventVisualization.
+    '''
+
+    def __init__(self, X, event_columns, source_column, class_column, date_column, period_column,
+                 get_event_path=None, get_severity_level=None, num_of_severity_levels=1, decision_threshold=13.8,
+                 **kwargs):
+        '''
+        :param X: a numpy array or a pandas DataFrame with the raw event data, see EventDataModel.data_object.
+        :param event_columns: a list with the original event column indexes, see EventDataModel.hierarchical_model.
+        :param source_column: column index (or DataFrame column label) of the source identifier.
+        :param class_column: column index (or label) of the source class.
+        :param date_column: column index (or label) of the date.
+        :param period_column: column index (or label) of the period.
+        :param get_event_path: see EventDataModel.hierarchical_model, the last path element is the event name.
+        :param get_severity_level: see EventDataModel.hierarchical_model.
+        :param num_of_severity_levels: see EventDataModel.hierarchical_model.
+        :param decision_threshold: the decision threshold of the EventVisualization created by execute_query.
+        :return:
+        '''
+        HasTraits.__init__(self, **kwargs)
+
+        self.data = X
+        self.event_columns = list(event_columns)
+        self.source_column = source_column
+        self.class_column = class_column
+        self.date_column = date_column
+        self.period_column = period_column
+        self.get_event_path = get_event_path
+        self.get_severity_level = get_severity_level
+        self.num_of_severity_levels = num_of_severity_levels if get_severity_level is not None else 1
+        self.decision_threshold = decision_threshold
+
+        # The rows by source and class, as indexes into the sorted unique values
+        self._source_ids, self._source_codes = unique(_get_column(X, source_column), return_inverse=True)
+        self._class_ids, self._class_codes = unique(_get_column(X, class_column), return_inverse=True)
+        self._source_id_codes = dict((source_id, code) for code, source_id in enumerate(self._source_ids))
+        self._class_id_codes = dict((class_id, code) for code, class_id in enumerate(self._class_ids))
+
+        # The rows sorted by date, as integer number of days since 1970-01-01
+        days = asarray(_get_column(X, date_column)).astype('datetime64[D]').astype(int32)
+        self._date_order = argsort(days, kind='mergesort')
+        self._sorted_days = days[self._date_order]
+
+        # The event columns by name and by severity level
+        self._event_name_columns = {}
+        self._column_severity_levels = {}
+        for column in self.event_columns:
+            name = get_event_path(column)[-1] if get_event_path is not None else "%i" % column
+            self._event_name_columns.setdefault(name, []).append(column)
+            self._column_severity_levels[column] = get_severity_level(column) if get_severity_level is not None else 0
+
+        self.list_of_source_ids = list(self._source_ids)
+        self.list_of_source_classes = [(class_id, "Class %s" % class_id) for class_id in self._class_ids]
+        self.list_of_event_names = sorted(self._event_name_columns)
+        self.list_of_event_severity_levels = [(level, "Level %i" % level) for level in range(self.num_of_severity_levels)]
+        self.selected_list_of_source_classes = list(self._class_ids)
+        self.selected_list_of_event_severity_levels = range(self.num_of_severity_levels)
+        self.selected_list_of_event_names = list(self.list_of_event_names)
+        if len(days) > 0:
+            self.period_start_date = self._sorted_days[0].astype('datetime64[D]').astype(object)
+            self.period_end_date = self._sorted_days[-1].astype('datetime64[D]').astype(object)
+
+    def get_selected_rows(self):
+        '''
+        Returns the rows in the selected period with a selected source class and source id. All sources are
+        selected when selected_list_of_source_ids is empty, since the EventSelectionDialog has no selector for them.
+        :return: an array with row indexes in increasing order.
+        '''
+        first = 0
+        last = len(self._sorted_days)
+        if self.period_start_date is not None:
+            first = searchsorted(self._sorted_days, datetime64(self.period_start_date, 'D').astype(int32), 'left')
+        if self.period_end_date is not None:
+            last = searchsorted(self._sorted_days, datetime64(self.period_end_date, 'D').astype(int32), 'right')
+        rows = self._date_order[first:last]
+
+        rows = rows[in1d(self._class_codes[rows], self._get_codes(self._class_id_codes, self.selected_list_of_source_classes))]
+        if len(self.selected_list_of_source_ids) > 0:
+            rows = rows[in1d(self._source_codes[rows], self._get_codes(self._source_id_codes, self.selected_list_of_source_ids))]
+
+        return sort(rows)
+
+    def get_selected_event_columns(self):
+        '''
+        :return: a list with the original event columns with a selected name and a selected severity level.
+        '''
+        levels = set(self.selected_list_of_event_severity_levels)
+        return sorted(column for name in set(self.selected_list_of_event_names)
+                      for column in self._event_name_columns.get(name, [])
+                      if self._column_severity_levels[column] in levels)
+
+    def get_selected_data(self):
+        '''
+        :return: the selected rows of the raw event data, see get_selected_rows.
+        '''
+        rows = self.get_selected_rows()
+        return self.data.iloc[rows] if hasattr(self.data, 'iloc') else self.data[rows]
+
+    def create_model(self):
+        '''
+        Creates an EventDataModel of the selected events, with an event data object of the selected rows and a fitted
+        anomaly detector.
+        :return: a tuple (model, data_object) with an instance of EventDataModel and its event data object.
+        '''
+        from visisc import EventDataModel
+
+        model = EventDataModel.hierarchical_model(
+            event_columns=self.get_selected_event_columns(),
+            get_event_path=self.get_event_path,
+            get_severity_level=self.get_severity_level,
+            num_of_severity_levels=self.num_of_severity_levels
+        )
+        data_object = model.data_object(
+            self.get_selected_data(),
+            source_column=self.source_column,
+            class_column=self.class_column,
+            period_column=self.period_column,
+            date_column=self.date_column
+        )
+        model.fit_anomaly_detector(data_object, poisson_onesided=True)
+        return model, data_object
+
+    def execute_query(self):
+        '''
+        Shows the selected rows and events in an EventVisualization.
+        :return:
+        '''
+        from visisc import EventVisualization
+
+        model, data_object = self.create_model()
+        self.visualization = EventVisualization(model, self.decision_threshold,
+                                                start_day=data_object.dates_.max(),
+                                                precompute_cache=True)
+
+    def _get_codes(self, id_codes, selected_ids):
+        '''
+        Returns the codes of the selected ids, as given by id_codes, ignoring ids that are not in the data. The ids are
+        looked up as they are, so that they are not converted to the type of the ids in the data.
+        '''
+        return array([id_codes[selected_id] for selected_id in selected_ids if selected_id in id_codes], dtype=int)
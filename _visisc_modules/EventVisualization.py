@@ -9,8 +9,6 @@ import logging
 import datetime
 
 import matplotlib
-from pandas.core import datetools
-from pandas import date_range
 from pyface.gui import GUI
 from traits.api import HasTraits, Instance
 from traits.has_traits import on_trait_change
@@ -26,10 +24,10 @@ from mayavi.tools.mlab_scene_model import \
     MlabSceneModel
 from mayavi.core.ui.mayavi_scene import MayaviScene
 
-from numpy import array, min, max, median, argmax, unique, linspace
+from numpy import array, min, max, linspace, datetime64, full
 
-import pyisc
-from visisc import EventDataModel
+from visisc import EventDataModel, EventScoreCache, EventFrameComputer, EventFramePrefetcher, to_day_number, \
+    from_day_number, profiler, profiled
 
 # This is used to ignore annoying error messages.
 class NullHandler(logging.Handler):
@@ -90,6 +88,12 @@ class EventVisualization(HasTraits):
     _low_start_day_number = Int(0) # minimum start day = 0
     _high_start_day_number = Int(100) # maximum start day = total number of days
 
+    # The time axis as day numbers (days since 1970-01-01): the first day in the data and the current time
+    _first_day = 0
+    _current_day = 0
+    # num_of_shown_days as an integer
+    _num_of_shown_days = 30
+
     # Configures the shown number of days in the visualization.
     num_of_shown_days = Trait("30 days", Enum([
         "7 days",
@@ -166,9 +170,11 @@ class EventVisualization(HasTraits):
         if play_pressed:
             if not self._play_thread:
                 self._play_thread = True
+                self._prefetch()
                 GUI.invoke_after(1, self._play_func)
         else:
             self._play_thread = False
+            self._prefetcher.cancel()
 
     def _play_func(self):
         '''
@@ -181,8 +187,29 @@ class EventVisualization(HasTraits):
             else:
                 self.move_forward()
 
+            # The next windows are scored while this one is shown
+            self._prefetch()
+
             GUI.invoke_after(1000, self._play_func)
 
+    def _prefetch(self):
+        '''
+        Requests that the rows of the next num_of_prefetched_windows windows in the direction of play are scored in
+        the background.
+        :return:
+        '''
+        if self._precompute_cache:
+            return
+        step = int(self.move_step[0])
+        if self._last_clicked_direction == self.move_backward:
+            step = -step
+        last_days = [self._current_day + i*step for i in xrange(1, self.num_of_prefetched_windows+1)]
+        self._prefetcher.prefetch([(last_day - self._num_of_shown_days, last_day) for last_day in last_days],
+                                  self.selected_source)
+
+    def _move_step_changed(self):
+        self._update_cache_size()
+
 
     @on_trait_change("Relative_Start_Day")
     def _relative_start_day_changed(self, new_value):
@@ -190,11 +217,13 @@ class EventVisualization(HasTraits):
 
     def _start_day_changed ( self, new_time ):
         if isinstance(new_time, int):
-            self.current_time = datetools.to_datetime(self._data_times.min()+datetools.Day(new_time))
+            self.current_time = from_day_number(self._first_day + new_time)
         elif isinstance(new_time, str):
-            self.current_time = datetools.to_datetime(new_time)
+            self.current_time = from_day_number(to_day_number(datetime64(new_time, 'D')))
         elif isinstance(new_time, datetime.date):
-            self.current_time = datetools.to_datetime(new_time)
+            self.current_time = new_time
+        elif isinstance(new_time, tuple):
+            self.current_time = datetime.date(*new_time)
         else:
             print "Unsupported start day ", new_time
             return
@@ -208,7 +237,7 @@ class EventVisualization(HasTraits):
             if new_source is not None:
                 self._selected_source_name = self._get_source_name(new_source)
                 self._update_selected_event(None)
-                self._update_selected_event(self._vis_model.get_num_of_selected_events()-1)
+                self._update_selected_event(self._expansion.get_num_of_events()-1)
             else:
                 self._selected_source_name = None
                 self._update_selected_event(None)
@@ -227,11 +256,11 @@ class EventVisualization(HasTraits):
                 self.selected_source = source_index
 
     def _current_time_changed(self, old_time, new_time):
-        num_of_days = int((datetools.to_datetime(new_time) - self._data_times.min()).days)
+        self._current_day = to_day_number(new_time)
+        num_of_days = self._current_day - self._first_day
         if self.Relative_Start_Day != num_of_days:
             self.Relative_Start_Day = num_of_days
         elif old_time != new_time:
-            self.current_time = datetools.to_datetime(self.current_time)
             self.update()
 
 
@@ -239,7 +268,7 @@ class EventVisualization(HasTraits):
     def _update_selected_event(self, event_index):
 
         if event_index > -1:
-            event = self._vis_model.get_selected_event(event_index)
+            event = self._expansion.get_event(event_index)
         else:
             event = None
 
@@ -249,16 +278,14 @@ class EventVisualization(HasTraits):
         self._old_event_name = None if event is None else event.name
 
         if event_index > -1:
-            selected_event = self._vis_model.expand_events(event.parent if self.selected_event > -1 and event_index >= self.selected_event else self._vis_model.get_selected_event(event_index))
+            selected_event = self._vis_model.expand(event.parent if self.selected_event > -1 and event_index >= self.selected_event else self._expansion.get_event(event_index), self._expansion).selected_index
         else:
-            selected_event = self._vis_model.expand_events(None)
+            selected_event = self._vis_model.expand(None, self._expansion).selected_index
 
         self.selected_event = selected_event
 
         if event is not None:
-            sevents = self._vis_model.get_selected_events_name()
-
-            names = list(sorted([pyisc._get_string_value(sevents,i) for i in range(self._vis_model.get_num_of_selected_events())]))
+            names = list(sorted([self._expansion.get_event(i).name for i in range(self._expansion.get_num_of_events())]))
 
             if event.name in names:
                 self._selected_events_list = names
@@ -273,62 +300,86 @@ class EventVisualization(HasTraits):
         if self._old_event_name is None or len(self._selected_event_name) == 1 and self._old_event_name != self._selected_event_name[0]:
             if len(oldvalue) != len(newvalue) or len(newvalue) == 1 and oldvalue[0] != newvalue[0]:
                 if len(self._selected_event_name) == 1 and self._selected_event_name[0] != 'None':
-                    event_index = self._vis_model.get_event_index(self._selected_event_name[0])
+                    event_index = self._expansion.get_event_index(self._selected_event_name[0])
                     self._update_selected_event(event_index)
                 else:
                     self._update_selected_event(None)
 
     def _num_of_shown_days_changed(self):
-        self.used_cache_size = self._num_of_shown_days_to_int()*self._num_of_sources
+        self._num_of_shown_days = int(str(self.num_of_shown_days).split(' ')[0])
+        self._update_cache_size()
         self.update()
 
+    def _update_cache_size(self):
+        '''
+        Limits the cache to the rows of the shown window and of the windows prefetched during playback.
+        :return:
+        '''
+        if not self._precompute_cache:
+            self.used_cache_size = (self._num_of_shown_days_to_int() + 1 +
+                                    self.num_of_prefetched_windows*int(self.move_step[0]))*self._num_of_sources
+            self.cache.max_entries = self.used_cache_size
+
 
-    # Used for caching anomaly calculations
-    _cache = dict()
+    # Used for caching anomaly calculations, an instance of EventScoreCache
+    cache = None
+    _precompute_cache = False
+    # The number of windows ahead whose rows are scored in the background during playback, see EventFramePrefetcher
+    num_of_prefetched_windows = 3
     # Used for scaling visualizatuion in the z direction
     _scale_z = Trait(0.1, Range(0.0, 1.0))
     # Used for setting a good default view in 3D
     _last_view = None
 
 
-    def __init__(self, visualisation_model, decision_threshold, start_day=3, num_of_shown_days="30 days", precompute_cache=False):
+    def __init__(self, visualisation_model, decision_threshold, start_day=3, num_of_shown_days="30 days", precompute_cache=False, n_jobs=1, cache_size_in_bytes=512*1024**2):
         '''
 
         :param visualisation_model: an instance of EventDataModel
         :param decision_threshold: a float larger or equal to 0.0 that is used for deciding when an anomaly score is significantly anomalous
-        :param start_day: an integer >= or an instance of datetime.date or an string, like "2014-10-11" or a tuple, like (2014, 10, 11)
+        :param start_day: an integer >= or an instance of datetime.date or numpy.datetime64 or an string, like "2014-10-11" or a tuple, like (2014, 10, 11)
         :param num_of_shown_days: an integer > 1 that specifies the number of days back in time from start_day that will be shown.
         :param precompute_cache: boolean that indates whether all anomaly scores should be computed at once or when asked for.
+        :param n_jobs: number of worker processes used when precomputing the cache, -1 means one per CPU.
+        :param cache_size_in_bytes: maximum memory used for caching anomaly calculations, None for no limit. It is
+        ignored when precompute_cache is True.
         :return:
         '''
         assert isinstance(visualisation_model, EventDataModel)
+        if isinstance(start_day, datetime64):
+            start_day = start_day.astype('datetime64[D]').astype(datetime.date)
         assert isinstance(start_day, int) or isinstance(start_day, str) or isinstance(start_day, datetime.date) or (isinstance(start_day, tuple) and len(start_day) == 3)
         HasTraits.__init__(self)
 
         self.used_cache_size = 0 # must be initialized
-        self._data = visualisation_model._event_data_object
+        self._precompute_cache = precompute_cache
+        self.cache = EventScoreCache(max_bytes=None if precompute_cache else cache_size_in_bytes)
 
-        self.num_of_shown_days = num_of_shown_days # Updates self.used_cache_size
+        # Set without notification, since there is no data to update yet, the cache size is set by _set_data
+        self.trait_setq(num_of_shown_days=num_of_shown_days)
+        self._num_of_shown_days = int(str(self.num_of_shown_days).split(' ')[0])
 
         self._vis_model = visualisation_model
         self._anomaly_detector = visualisation_model._anomaly_detector
         self.anomaly_detection_threshold = decision_threshold
 
-        dates = visualisation_model._event_data_object.dates_
-        self._data_times = array([datetools.to_datetime(d) for d in dates])
+        # The events shown for the selected source, the model's own selected events are not used so that several
+        # visualizations can share one model
+        self._expansion = visualisation_model.expand(None)
 
-        self.source_names = list(unique(visualisation_model._event_data_object.sources_))
-        self._data_sources = array([self.source_names.index(source) for source in visualisation_model._event_data_object.sources_])
-        self._num_of_sources = len(unique(self.source_names)) # number of sources
+        # Computes what is shown in each frame
+        self._frames = EventFrameComputer(visualisation_model, decision_threshold, self.cache)
+        self._prefetcher = EventFramePrefetcher(self._frames)
+
+        self._set_data(visualisation_model._event_data_object)
 
         self.barcharts = []
         self.barchart_actors = []
+        self._barchart_severities = []
         self.time_text3ds = []
         self.source_text3ds = []
         self.xy_positions = []
 
-        self._high_start_day_number = int((self._data_times.max() - self._data_times.min()).days)
-
         self.scene.anti_aliasing_frames = 8
 
         # add traits dynamically
@@ -360,47 +411,147 @@ class EventVisualization(HasTraits):
         # Cache all anomaly calculations for all data values
         if precompute_cache:
             self.used_cache_size = len(self._data)
+            self.cache.max_entries = None
+            all_devs, all_sevs, all_expect = self._vis_model.score_all(n_jobs=n_jobs)
             for data_index in xrange(len(self._data)):
-                self._populate_cache(data_index)
+                self._frames.put_scores(data_index, (all_devs[data_index], all_sevs[data_index], all_expect[data_index], None, None))
 
         self.start_day = start_day
 
         self.update()
 
 
+    def _set_data(self, data):
+        '''
+        Sets the event data object that is visualized.
+        :param data: an instance of EventDataObject
+        :return:
+        '''
+        self._data = data
+
+        # The index of rows by source and date, used for finding the rows shown in the current window, is built by
+        # the frame computer, which already has it for the event data object it was created with
+        if self._frames.data is not data:
+            self._frames.set_data(data)
+        self.source_names = self._frames.source_names
+        self._data_sources = self._data.source_codes_
+        self._num_of_sources = self._frames.num_of_sources # number of sources
+
+        self._first_day = int(data.days_.min())
+        self._high_start_day_number = int(data.days_.max()) - self._first_day
+
+        self._update_cache_size()
+
+    def append_data(self, X, period_column, date_column, source_column, class_column=None, refit=False):
+        '''
+        Appends new rows, like the data of a new day, to the visualized model, see EventDataModel.append. Only the
+        new rows are scored, and the cached anomaly calculations are only invalidated if the anomaly detector is
+        refitted.
+        :param X: an numpy array or a pandas DataFrame with the new rows, see EventDataModel.data_object.
+        :param period_column: see EventDataModel.data_object.
+        :param date_column: see EventDataModel.data_object.
+        :param source_column: see EventDataModel.data_object.
+        :param class_column: see EventDataModel.data_object.
+        :param refit: boolean that indicates whether the anomaly detector should be updated with the new rows.
+        :return:
+        '''
+        selected_source_name = None if self.selected_source is None else self._get_source_name(self.selected_source)
+
+        # The background thread must not read the rows while the data object is replaced
+        self._prefetcher.cancel()
+
+        new_indexes, devs, sevs, expect = self._vis_model.append(X, period_column, date_column, source_column, class_column, refit=refit)
+        if refit:
+            self.cache.invalidate()
+
+        self._set_data(self._vis_model._event_data_object)
+
+        self.add_trait("Relative_Start_Day", Range(0, self._high_start_day_number))
+        self.add_trait("_selected_source_name", Enum(None,[None]+self.source_names))
+        if selected_source_name is not None:
+            # The source indexes are changed if there are new sources
+            self.trait_setq(selected_source=self.source_names.index(selected_source_name))
+
+        for i in xrange(len(new_indexes)):
+            self._frames.put_scores(new_indexes[i], (devs[i], sevs[i], expect[i], None, None))
+
+        self.update()
+
+    @profiled("update.render.barcharts")
     def _create_barcharts(self, severities, x, y, z):
         '''
-        Creates and shows the 3D bars
+        Shows the 3D bars. There is one persistent bar chart per severity level, which is created the first time
+        the severity level is shown and then updated in place, and hidden when the severity level is not shown.
         :param severities:
         :param x:
         :param y:
         :param z:
         :return:
         '''
-        #self.scene.disable_render = True
-
         x = array(x)
         y = array(y)
         z = array(z)
         severities = array(severities)
 
-        for s in set(severities):
-            s_index = (severities == s)
+        for s in set(severities) - set(self._barchart_severities):
             color = self.normal_barcolor if s == -1 else self.background if s == -2 else self.severity_color[s]
+            s_index = (severities == s)
+
+            barchart = self.scene.mlab.barchart(x[s_index], y[s_index], z[s_index], color=color,  auto_scale=False, reset_zoom=False)
+            barchart.actor.actors[0].scale = array([1.0, 1.0, self._scale_z])
+            self._barchart_severities.append(s)
+            self.barcharts.append(barchart)
+            self.barchart_actors.append(barchart.actor.actors[0])
+            self.xy_positions.append(None)
+
+        for i in xrange(len(self._barchart_severities)):
+            s_index = (severities == self._barchart_severities[i])
             x0 = x[s_index]
             y0 = y[s_index]
             z0 = z[s_index]
 
-            barchart = self.scene.mlab.barchart(x0, y0, z0, color=color,  auto_scale=False, reset_zoom=False)
-            self.barcharts.append(barchart)
-            self.barchart_actors.append(barchart.actor.actors[0])
-            self.xy_positions.append((x0,y0,z0))
+            if len(x0) > 0:
+                self._update_barchart(self.barcharts[i], x0, y0, z0)
+            self.barcharts[i].visible = len(x0) > 0
+            self.xy_positions[i] = (x0,y0,z0)
+
+    def _update_barchart(self, barchart, x, y, heights):
+        '''
+        Pushes new bar positions and heights to an existing bar chart.
+        '''
+        source = barchart.mlab_source
+        if len(source.x) == len(x) and (source.x == x).all() and (source.y == y).all() and (source.w == heights).all():
+            return # Nothing changed
 
-        for actor in self.barchart_actors:
-            actor.scale = array([1.0, 1.0, self._scale_z])
+        values = dict(x=x, y=y, w=heights, scalars=heights)
+        # These are the same for all bars, like the lateral size of the bars, and are kept as they were created
+        for name in ('z', 'u', 'v'):
+            values[name] = full(len(x), getattr(source, name).flat[0])
 
-            #self.scene.disable_render = False
+        if len(source.x) == len(x):
+            source.set(**values)
+        else:
+            source.reset(**values)
 
+    @profiled("update.render.labels")
+    def _update_text3ds(self, text3ds, texts, positions, colors, scale, orientation):
+        '''
+        Updates a pool of 3D texts in place. New texts are only created when more texts are shown than before and the
+        ones not used are hidden.
+        '''
+        for i in xrange(len(texts)):
+            if i < len(text3ds):
+                text3d = text3ds[i]
+                text3d.text = texts[i]
+                text3d.position = positions[i]
+                text3d.scale = array([scale, scale, scale])
+                text3d.actor.property.color = colors[i]
+                text3d.visible = True
+            else:
+                text3ds.append(self.scene.mlab.text3d(positions[i][0], positions[i][1], positions[i][2], texts[i], scale=scale, color=colors[i], orient_to_camera=False, orientation=orientation))
+
+        for text3d in text3ds[len(texts):]:
+            text3d.visible = False
 
     def clear_figure(self):
         '''
@@ -413,36 +564,18 @@ class EventVisualization(HasTraits):
         # It is an invisibale point outside the 3D bar plot region.
         self.scene.mlab.get_engine().current_object = self._obj
 
+        self.barcharts = []
         self.barchart_actors = []
         self.xy_positions = []
-
-    def _trim_cache(self, data_index, used_cache_size):
-        '''
-        Keeps the cache to the defined size.
-        :param data_index:
-        :param used_cache_size:
-        :return:
-        '''
-        if len(self._cache) > used_cache_size:
-            max_index = max(self._cache.keys())
-            min_index = min(self._cache.keys())
-            if data_index > max_index:
-                del self._cache[min_index]
-            elif data_index < min_index:
-                del self._cache[max_index]
-            else:  # Remove the one farest away
-                median_index = median(self._cache.keys())
-                triple_indexes = array([min_index, median_index, max_index])
-                diffs = abs(data_index - triple_indexes)
-                diff_max_index = diffs.argmax()
-
-                del self._cache[triple_indexes[diff_max_index]]
+        self._barchart_severities = []
 
     def update(self):
         '''
         Plots the 3D bars and axis.
         :return:
         '''
+        profiler.begin_frame()
+
         is_first_update = False
 
         if self._last_view is None:
@@ -453,155 +586,59 @@ class EventVisualization(HasTraits):
             self._last_view = self.scene.mlab.view()
 
         self.scene.disable_render = True
-        self.clear_figure()
-        #print "Day: %s" % time.ctime(self.current_time)
-
-
-        max_z = 0
-
-        time_index = ((self._data_times <= datetools.to_datetime(self.current_time)) &
-                      (self._data_times >= (datetools.to_datetime(self.current_time) - self._num_of_shown_days_to_timedelta())))
-
-        if self.selected_source is None: # Plot all sources
-            x = []
-            y = []
-            z = []
-            severities = []
-
-
-            for source in range(self._num_of_sources):
-                for data_index in array(range(len(self._data)))[time_index][self._data_sources[time_index] == source]:
-                    if self.used_cache_size > 0 and self._cache.has_key(data_index):
-                        devsptr, sevs, expectptr, min2, max2, count = self._cache[data_index]
-                    else:
-                        devs, sevs, expect, min2, max2= self._vis_model.calc_one(data_index)
-
-                        devsptr = pyisc._to_cpp_array(devs)
-                        expectptr = pyisc._to_cpp_array(expect)
-
-                        count = None
-
-                    if count is None:
-                        self._trim_cache(data_index, self.used_cache_size)
-                        vec = self._data._get_intfloat(data_index)
-                        count = sum([pyisc._get_intfloat_value(vec, self._vis_model.get_event_hierarchy().get_index_value(l)) for l in range(self._vis_model.num_of_severity_levels_) if self._vis_model.get_event_hierarchy().get_index_value(l) != -1 ])
-                        self._cache[data_index] = (devsptr, sevs, expectptr, min2, max2, count)
-
-
-                    ztime = self._num_of_shown_days_to_int()-(self.current_time-self._data_times[data_index]).days
-
-                    x.append(source)
-                    y.append(ztime)
-
-                    z.append(count)
-
-
-                    sev_max = argmax(sevs)
-                    sev = (-1 if sevs[sev_max] < self.anomaly_detection_threshold else sev_max)
-
-                    severities.append(sev)
-            self._create_barcharts(severities, x, y, z)
-
-            max_z = max([max_z]+z)
-        else: # Plot for selected source
-            source_index = self._data_sources[time_index] == self.selected_source
-
-            data_indexes = array(range(len(self._data)))[time_index][source_index]
-            x = []
-            y = []
-            z = []
-            severities = []
 
-            # Plot selected events
-            for data_index in data_indexes:
-                if self.used_cache_size > 0 and self._cache.has_key(data_index):
-                    devsptr, sevs, expectptr, min2, max2, _ = self._cache[data_index]
-                else:
-                    devs, sevs,expect, min2, max2 = self._vis_model.calc_one(data_index)
-                    devsptr = pyisc._to_cpp_array(devs)
-                    expectptr = pyisc._to_cpp_array(expect)
-
-
-                    self._trim_cache(data_index, self.used_cache_size)
-
-                    self._cache[data_index] = (devsptr, sevs, expectptr, min2, max2, None)
-
-                ztime = self._num_of_shown_days_to_int()-(datetools.to_datetime(self.current_time)-self._data_times[data_index]).days
-
-
-                if self._vis_model.get_num_of_selected_events() > 0:
-                    for element in range(self._vis_model.get_num_of_selected_events()):
-                        x.append(element)
-                        y.append(ztime)
+        with profiler.timer("update.compute"):
+            frame = self.compute_frame()
 
-                        (dev, sev, count, mexp, maxind) = self._vis_model.summarize_event_children(self._vis_model.get_selected_event(element), devsptr, expectptr, self._data._get_intfloat(data_index), 1 if element >= self.selected_event else 0)
-                        z.append(count)
-
-
-                        if dev < self.anomaly_detection_threshold:
-                            severities.append(-1)
-                        else:
-                            severities.append(sev)
-
-            self._create_barcharts(severities, x, y, z)
-            max_z = max([max_z]+z)
+        self._create_barcharts(frame.severities, frame.x, frame.y, frame.z)
 
         self.scene.disable_render = True
 
-        datetime.date
+        time_strs = frame.time_labels
 
-        curr_t = self.current_time
-        time_strs = [str(t.date())for t in date_range(curr_t-self._num_of_shown_days_to_timedelta(), curr_t)]
         time_max_len = min([len(t) for t in time_strs])
 
-        max_x = (self._num_of_sources if self.selected_source is None else  self._vis_model.get_num_of_selected_events())
+        max_x = (self._num_of_sources if self.selected_source is None else  self._expansion.get_num_of_events())
         max_y = self._num_of_shown_days_to_int()
 
-        if len(self.time_text3ds) != len(time_strs):
-            self.scene.remove_actors([t.actor.actors[0] for t in self.time_text3ds])
-            self.time_text3ds = []
+        self._update_text3ds(self.time_text3ds,
+                             time_strs,
+                             [(max_x+time_max_len/2-1, slot, 0) for slot in xrange(len(time_strs))],
+                             [self.textcolor]*len(time_strs),
+                             0.5, (180, 180, 0))
 
-            for slot in range(len(time_strs)):
-                name = time_strs[slot]
-                pos = (max_x+time_max_len/2-1, slot, 0)
-                self.time_text3ds.append(self.scene.mlab.text3d(*pos, text=name, scale=0.5, color=self.textcolor, orient_to_camera=False, orientation=(180, 180, 0)))
-        else:
-            for slot in range(len(time_strs)):
-                name = time_strs[slot]
-                pos = (max_x+time_max_len/2-1, slot, 0)
-
-                self.time_text3ds[slot].position = pos
-                self.time_text3ds[slot].text=name
+        source_strs = frame.source_labels
+        num_of_sources = len(source_strs)
 
         if self.selected_source is None:
-            source_strs = [self._get_source_name(source) for source in range(self._num_of_sources)]
-            num_of_sources = self._num_of_sources
+            colors = [self.textcolor]*num_of_sources
+            scale = 0.6
         else:
-            source_strs = [self._get_event_name(element) for element in range(self._vis_model.get_num_of_selected_events())]
-            num_of_sources = self._vis_model.get_num_of_selected_events()
-
-        if len(self.source_text3ds) != num_of_sources or self.selected_source is None:
-            self.scene.remove_actors([t.actor.actors[0] for t in self.source_text3ds])
-            self.source_text3ds = []
-            for source in range(num_of_sources):
-                name = source_strs[source]
-                if self.selected_source is None:
-                    self.source_text3ds.append(self.scene.mlab.text3d(source, max_y + 0.5, 0, name, scale=0.6, color=self.textcolor, orient_to_camera=False, orientation=(0, 0, 90)))
-                else:
-                    self.source_text3ds.append(self.scene.mlab.text3d(source, max_y + 0.5, 0, name, color=self.textcolor if source < self.selected_event else (192.0/255, 192.0/255, 192.0/255) if source > self.selected_event else (1.0, 1.0,  1.0), scale=0.5, orient_to_camera=False, orientation=(0, 0, 90)))
-        else:
-            for source in range(num_of_sources):
-                name = source_strs[source]
-                self.source_text3ds[source].text = name
-                self.source_text3ds[source].position = (source, max_y + 0.5, 0)
+            colors = [self.textcolor if source < self.selected_event else (192.0/255, 192.0/255, 192.0/255) if source > self.selected_event else (1.0, 1.0,  1.0) for source in xrange(num_of_sources)]
+            scale = 0.5
+        self._update_text3ds(self.source_text3ds,
+                             source_strs,
+                             [(source, max_y + 0.5, 0) for source in xrange(num_of_sources)],
+                             colors,
+                             scale, (0, 0, 90))
 
         if is_first_update:
             self.scene.reset_zoom()
 
-        self.scene.disable_render = False
+        with profiler.timer("update.render.scene"):
+            self.scene.disable_render = False
+
+        profiler.end_frame()
 
         return
 
+    def compute_frame(self):
+        '''
+        Computes the bars and labels of the current frame without rendering them.
+        :return: an instance of EventFrame
+        '''
+        return self._frames.compute_frame(self._current_day, self._num_of_shown_days, self.selected_source, self.selected_event, self._expansion)
+
     last_picker = None
     def vis_picker(self,picker):
         '''
@@ -632,31 +669,25 @@ class EventVisualization(HasTraits):
                 if self.selected_source is None:
                     if _source >= 0 and _source < self._num_of_sources:
                         self.selected_source = _source
-                elif _source >= 0 and _source < self._vis_model.get_num_of_selected_events():
+                elif _source >= 0 and _source < self._expansion.get_num_of_events():
                     self._update_selected_event(_source)
 
 
-    def _num_of_shown_days_to_timedelta(self):
-        return datetools.to_offset(str(self.num_of_shown_days).split(' ')[0]+"d")
-
     def _num_of_shown_days_to_int(self):
-        return int(str(self.num_of_shown_days).split(' ')[0])
+        return self._num_of_shown_days
 
     def _get_source_name(self,source):
         return self.source_names[source]
 
     def _get_event_name(self,element):
-        return self._vis_model.get_selected_event(element).name
-
-
-    def _populate_cache(self, data_index):
-        devs, sevs, expect, min2, max2= self._vis_model.calc_one(data_index)
+        return self._expansion.get_event(element).name
 
-        devsptr = pyisc._to_cpp_array(devs)
-        expectptr = pyisc._to_cpp_array(expect)
 
-        vec = self._data._get_intfloat(data_index)
-        count = sum([pyisc._get_intfloat_value(vec, self._vis_model.get_event_hierarchy().get_index_value(l)) for l in xrange(self._vis_model.num_of_severity_levels_) if self._vis_model.get_event_hierarchy().get_index_value(l) != -1 ])
-
-        self._cache[data_index] = (devsptr, sevs, expectptr, min2, max2, count)
+    def _get_scores(self, data_index, details=None):
+        return self._frames.get_scores(data_index, details)
 
+    def get_cache_statistics(self):
+        '''
+        :return: a dictionary with the size and the hit, miss and eviction counters of the anomaly calculations cache.
+        '''
+        return self.cache.get_statistics()
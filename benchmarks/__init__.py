@@ -0,0 +1,14 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+'''
+Benchmarks for visISC. The synthetic event data is created by benchmarks.generator and the timed stages are run by
+benchmarks.run_benchmarks, which writes the results as JSON:
+
+    python -m benchmarks.run_benchmarks --num-of-sources 1000 --output results.json
+
+The benchmarks do not open any windows, so they can be run on machines without a display.
+'''
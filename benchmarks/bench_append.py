@@ -0,0 +1,67 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+'''
+Measures the time it takes to append the data of a new day to a fitted EventDataModel with refitting, both for the
+model itself and for the model saved and loaded again with EventDataModel.save and EventDataModel.load, and checks
+that both give the same anomaly scores for all rows.
+
+Run as: python benchmarks/bench_append.py [num_of_sources] [num_of_days] [shard_by_class]
+'''
+
+import sys
+import time
+import shutil
+import tempfile
+
+import numpy as np
+
+from benchmarks.generator import generate_event_data
+
+__author__ = 'tol'
+
+
+def main(num_of_sources=100, num_of_days=100, shard_by_class=0):
+    data = generate_event_data(num_of_sources=num_of_sources, num_of_days=num_of_days+1)
+
+    old = data.dates < data.dates.max()
+    new = ~old
+
+    model = data.create_model()
+    model.data_object(data.counts[old], data.periods[old], data.dates[old], data.sources[old], data.classes[old])
+    model.fit_anomaly_detector(model._event_data_object, shard_by_class=bool(shard_by_class))
+
+    path = tempfile.mkdtemp()
+    try:
+        model.save(path)
+        loaded_model = model.load(path)
+
+        t0 = time.time()
+        model.append(data.counts[new], data.periods[new], data.dates[new], data.sources[new], data.classes[new],
+                     refit=True)
+        t_append = time.time()-t0
+
+        t0 = time.time()
+        loaded_model.append(data.counts[new], data.periods[new], data.dates[new], data.sources[new], data.classes[new],
+                            refit=True)
+        t_loaded_append = time.time()-t0
+
+        # The anomaly detector of the loaded model is fitted on the saved rows before it is updated with the new rows
+        for scores, loaded_scores in zip(model.score_all(), loaded_model.score_all()):
+            if not np.allclose(scores, loaded_scores):
+                raise AssertionError("The loaded model gives other scores after append than the saved model")
+    finally:
+        shutil.rmtree(path)
+
+    print "rows: %i, new rows: %i, event columns: %i" % (len(data.counts), new.sum(), model.num_of_event_columns)
+    print "append:        %.3f s" % t_append
+    print "loaded append: %.3f s (including fitting the anomaly detector of the loaded model)" % t_loaded_append
+
+    return model
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,91 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+'''
+Compares the time it takes to create an EventDataObject with the aggregation matrix used by
+EventDataModel.data_object to the time it takes with the leaf-by-leaf loop that was used before.
+
+Run as: python benchmarks/bench_data_object.py [num_of_sources] [num_of_days] [num_of_events]
+'''
+
+import sys
+import time
+import datetime
+
+import numpy as np
+from numpy import array, r_
+
+import visisc
+
+__author__ = 'tol'
+
+
+def loop_aggregation(model, X, period_column, class_column):
+    '''
+    The aggregation loop previously used in EventDataModel.data_object.
+    '''
+    XT = X.T
+    offset_columns = [col for col in [class_column, period_column] if col is not None]
+    X_newT = r_[
+        XT[offset_columns],
+        array([[0.0 for _ in xrange(len(X))] for _ in xrange(model.num_of_event_columns)])
+    ]
+    event = model.root
+    while event is not None:
+        if event.num_of_children == 0:
+            for sev_lev_ind in xrange(model.num_of_severity_levels_):
+                if event.get_index_value(sev_lev_ind) != -1:
+                    current = event
+                    while current is not None:
+                        X_newT[current.get_index_value(sev_lev_ind)] += XT[model._event_sev2original_column_map[(event.name,sev_lev_ind)]]
+                        current = current.parent
+        event = event.next()
+    return X_newT
+
+
+def main(num_of_sources=100, num_of_days=100, num_of_events=1000):
+    source_column = 0
+    class_column = 1
+    date_column = 2
+    period_column = 3
+    first_event_column = 4
+
+    num_of_rows = num_of_sources*num_of_days
+    X = np.c_[
+        np.repeat(np.arange(num_of_sources), num_of_days),
+        np.zeros(num_of_rows, dtype=int),
+        np.tile(array([datetime.date(2015,2,24) + datetime.timedelta(d) for d in range(num_of_days)]), num_of_sources),
+        np.ones(num_of_rows, dtype=int),
+        np.random.poisson(1.0, (num_of_rows, num_of_events))
+    ]
+
+    model = visisc.EventDataModel.hierarchical_model(
+        event_columns=range(first_event_column, first_event_column+num_of_events),
+        get_event_path=lambda x: ["Type_%i" % (x/100), "Type_%i" % (x/10), "event_%i" % x]
+    )
+
+    t0 = time.time()
+    X_loop = loop_aggregation(model, X, period_column, class_column)
+    t_loop = time.time()-t0
+
+    t0 = time.time()
+    data_object = model.data_object(X, period_column, date_column, source_column, class_column)
+    t_matrix = time.time()-t0
+
+    # Both give the same counts
+    if not np.allclose(X_loop.T.astype(float), data_object.matrix_):
+        raise AssertionError("The matrix of data_object differs from the matrix of the aggregation loop")
+
+    print "rows: %i, event columns: %i" % (num_of_rows, model.num_of_event_columns)
+    print "loop:   %.3f s" % t_loop
+    print "matrix: %.3f s (data_object including EventDataObject creation)" % t_matrix
+    print "speedup: %.1fx" % (t_loop/t_matrix)
+
+    return data_object
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
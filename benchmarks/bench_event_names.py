@@ -0,0 +1,64 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+'''
+Measures the time it takes to build a hierarchical EventDataModel over many synthetic event paths and to look up
+events by name with the model's hash index, compared to a linear scan over the events in depth first order.
+
+Run as: python benchmarks/bench_event_names.py [num_of_events] [num_of_linear_lookups]
+'''
+
+import sys
+import time
+
+import visisc
+
+__author__ = 'tol'
+
+
+def linear_lookup(model, name):
+    '''
+    Finds an event by walking the event hierarchy, as name lookups were done before the model had a name index.
+    '''
+    event = model.root
+    while event is not None:
+        if event.name == name:
+            return event
+        event = event.next()
+    return None
+
+
+def main(num_of_events=100000, num_of_linear_lookups=100):
+    t0 = time.time()
+    model = visisc.EventDataModel.hierarchical_model(
+        event_columns=range(num_of_events),
+        get_event_path=lambda x: ["Type_%i" % (x/1000), "Type_%i" % (x/100), "Type_%i" % (x/10), "event_%i" % x]
+    )
+    t_build = time.time()-t0
+
+    names = model.node_names_
+
+    t0 = time.time()
+    for name in names:
+        assert model.get_event(name).name == name
+    t_index = time.time()-t0
+
+    sample = names[::max(1, len(names)/num_of_linear_lookups)][:num_of_linear_lookups]
+    t0 = time.time()
+    for name in sample:
+        assert linear_lookup(model, name).name == name
+    t_linear = time.time()-t0
+
+    print "events: %i, nodes: %i" % (num_of_events, len(names))
+    print "model construction: %.3f s" % t_build
+    print "hash index lookup:  %.2f us per name (%i names)" % (1e6*t_index/len(names), len(names))
+    print "linear lookup:      %.2f us per name (%i names)" % (1e6*t_linear/len(sample), len(sample))
+
+    return model
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
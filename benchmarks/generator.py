@@ -0,0 +1,129 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+'''
+A parametric generator of synthetic event frequency data, like the data in the examples in docs/, but created with
+vectorized numpy operations so that large data sets can be created quickly.
+'''
+
+import numpy as np
+from scipy import sparse
+
+__author__ = 'tol'
+
+
+class SyntheticEventData(object):
+    '''
+    Synthetic event data with one row per source and day. The counts matrix has one column per event, while the
+    periods, dates, sources and classes are given as separate arrays, which can all be passed directly to
+    EventDataModel.data_object. The counts matrix is a scipy.sparse CSR matrix if generated with a sparsity, so that
+    the event data object is a SparseEventDataObject.
+    '''
+
+    def __init__(self, counts, periods, dates, sources, classes, hierarchy_depth, hierarchy_width,
+                 num_of_severity_levels, anomalous_rows):
+        self.counts = counts
+        self.periods = periods
+        self.dates = dates
+        self.sources = sources
+        self.classes = classes
+        self.hierarchy_depth = hierarchy_depth
+        self.hierarchy_width = hierarchy_width
+        self.num_of_severity_levels = num_of_severity_levels
+        # The rows with injected anomalies
+        self.anomalous_rows = anomalous_rows
+
+    @property
+    def event_columns(self):
+        return range(self.counts.shape[1])
+
+    def get_event_path(self, column):
+        '''
+        The path of an event, with hierarchy_depth-1 levels of event types above the event, where each type has
+        (up to) hierarchy_width sub types.
+        '''
+        return ["Type_%i_%i" % (level, column // self.hierarchy_width**(self.hierarchy_depth-level))
+                for level in xrange(1, self.hierarchy_depth)] + ["event_%i" % column]
+
+    def get_severity_level(self, column):
+        return column % self.num_of_severity_levels
+
+    def create_model(self):
+        '''
+        :return: a hierarchical EventDataModel of the events.
+        '''
+        import visisc
+        return visisc.EventDataModel.hierarchical_model(
+            event_columns=self.event_columns,
+            get_event_path=self.get_event_path,
+            get_severity_level=self.get_severity_level if self.num_of_severity_levels > 1 else None,
+            num_of_severity_levels=self.num_of_severity_levels
+        )
+
+    def create_data_object(self, model):
+        return model.data_object(self.counts, self.periods, self.dates, self.sources, self.classes)
+
+
+def generate_event_data(num_of_sources=100, num_of_classes=10, num_of_events=100, hierarchy_depth=3,
+                        hierarchy_width=5, num_of_severity_levels=1, num_of_days=100, sparsity=0.0,
+                        num_of_anomalies=10, anomaly_factor=5.0, seed=0, chunk_size=10000):
+    '''
+    Generates Poisson distributed event counts, where each class of sources has its own rate for each event.
+
+    :param num_of_sources: number of sources, each source has one row per day.
+    :param num_of_classes: number of source classes, the sources are evenly divided among the classes.
+    :param num_of_events: number of event types (columns).
+    :param hierarchy_depth: number of levels in the event paths, including the events.
+    :param hierarchy_width: number of sub types of each event type.
+    :param num_of_severity_levels: number of severity levels, the events are evenly divided among the levels.
+    :param num_of_days: number of days.
+    :param sparsity: fraction (0.0 to 1.0) of the events of a class that never occur. If larger than 0.0, the counts
+    are generated as a scipy.sparse CSR matrix.
+    :param num_of_anomalies: number of rows with injected anomalies.
+    :param anomaly_factor: the factor the rates of an anomalous row are multiplied with.
+    :param seed: the seed of the random number generator.
+    :param chunk_size: number of rows generated at a time when the counts are sparse.
+    :return: an instance of SyntheticEventData
+    '''
+    random = np.random.RandomState(seed)
+
+    num_of_rows = num_of_sources*num_of_days
+    source_classes = np.arange(num_of_sources) % num_of_classes
+
+    rates = random.gamma(2.0, 1.0, (num_of_classes, num_of_events))
+    rates[random.random_sample(rates.shape) < sparsity] = 0.0
+
+    classes = np.repeat(source_classes, num_of_days)
+
+    anomalous_rows = np.sort(random.choice(num_of_rows, min(num_of_anomalies, num_of_rows), replace=False))
+
+    def generate_counts(rows):
+        row_rates = rates[classes[rows]]
+        anomalous = np.in1d(rows, anomalous_rows)
+        row_rates[anomalous] = row_rates[anomalous]*anomaly_factor + 1.0
+        return random.poisson(row_rates).astype(float)
+
+    if sparsity > 0.0:
+        # The dense counts of all rows are never in memory at once, and the counts are the same as if generated dense,
+        # since the random numbers are drawn in the same order
+        counts = sparse.vstack([
+            sparse.csr_matrix(generate_counts(np.arange(start, min(start+chunk_size, num_of_rows))))
+            for start in xrange(0, num_of_rows, chunk_size)
+        ], format='csr')
+    else:
+        counts = generate_counts(np.arange(num_of_rows))
+
+    return SyntheticEventData(
+        counts=counts,
+        periods=np.ones(num_of_rows),
+        dates=np.tile(np.datetime64('2015-02-24') + np.arange(num_of_days), num_of_sources),
+        sources=np.repeat(np.array(["Source %i" % i for i in xrange(num_of_sources)]), num_of_days),
+        classes=classes,
+        hierarchy_depth=hierarchy_depth,
+        hierarchy_width=hierarchy_width,
+        num_of_severity_levels=num_of_severity_levels,
+        anomalous_rows=anomalous_rows
+    )
@@ -0,0 +1,177 @@
+# Copyright (C) 2014, 2015, 2016 SICS Swedish ICT AB
+#
+# Main author: Tomas Olsson <tol@sics.se>
+#
+# License: BSD 3 clause
+
+'''
+Times the stages from creating an event data model to computing the frames of the visualization on synthetic event
+data, see benchmarks.generator, and writes the results as JSON. No windows are opened, so it can be run on machines
+without a display.
+
+Run as: python -m benchmarks.run_benchmarks [options], see --help.
+'''
+
+import os
+# Must be set before traits and mayavi are imported by visisc
+os.environ.setdefault('ETS_TOOLKIT', 'null')
+
+import sys
+import json
+import time
+import platform
+import argparse
+import multiprocessing
+
+import numpy as np
+from scipy import sparse
+
+import visisc
+from benchmarks.generator import generate_event_data
+
+__author__ = 'tol'
+
+
+class StageTimer(object):
+    '''
+    Collects the wall clock time of named stages, each stage is timed by running it in a with statement.
+    '''
+
+    def __init__(self):
+        self.stages = []
+
+    def __call__(self, name, **info):
+        self._name = name
+        self._info = info
+        return self
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        stage = dict(self._info)
+        stage['name'] = self._name
+        stage['seconds'] = time.time() - self._start
+        self.stages.append(stage)
+        print >> sys.stderr, "%-30s %10.3f s" % (self._name, stage['seconds'])
+
+
+def run(args):
+    timer = StageTimer()
+
+    if args.profile:
+        visisc.profiler.reset()
+        visisc.profiler.enable()
+
+    with timer("generate_event_data"):
+        data = generate_event_data(
+            num_of_sources=args.num_of_sources,
+            num_of_classes=args.num_of_classes,
+            num_of_events=args.num_of_events,
+            hierarchy_depth=args.hierarchy_depth,
+            hierarchy_width=args.hierarchy_width,
+            num_of_severity_levels=args.num_of_severity_levels,
+            num_of_days=args.num_of_days,
+            sparsity=args.sparsity,
+            num_of_anomalies=args.num_of_anomalies,
+            seed=args.seed
+        )
+
+    with timer("hierarchical_model"):
+        model = data.create_model()
+
+    with timer("data_object", rows=data.counts.shape[0], sparse=sparse.issparse(data.counts)):
+        data_object = data.create_data_object(model)
+
+    # When sharding by class, all rows are also scored when the anomaly detectors are fitted
+    with timer("fit_anomaly_detector", n_jobs=args.n_jobs if args.shard_by_class else 1,
+               scores_all_rows=args.shard_by_class):
+        model.fit_anomaly_detector(data_object, poisson_onesided=True, shard_by_class=args.shard_by_class,
+                                   n_jobs=args.n_jobs)
+
+    rows = np.linspace(0, len(data_object)-1, min(args.num_of_rows, len(data_object))).astype(int)
+    with timer("calc_one", rows=len(rows)):
+        for row in rows:
+            model.calc_one(int(row))
+
+    # When sharding by class, the scores computed by fit_anomaly_detector are only looked up
+    with timer("calc_many" if not args.shard_by_class else "calc_many_precomputed", rows=len(data_object),
+               n_jobs=args.n_jobs):
+        devs, severities, expect = model.score_all(n_jobs=args.n_jobs)
+
+    num_of_detected = int((severities[data.anomalous_rows].max(axis=1) >= args.threshold).sum())
+
+    frames = visisc.EventFrameComputer(model, args.threshold)
+    first_day = int(data.dates.min().astype(np.int64)) + args.num_of_shown_days
+    last_day = int(data.dates.max().astype(np.int64))
+    days = range(first_day, last_day+1)[:args.num_of_frames]
+
+    with timer("compute_frame_all_sources", frames=len(days)):
+        for day in days:
+            frames.compute_frame(day, args.num_of_shown_days)
+
+    expansion = model.expand(None)
+    model.expand(expansion.get_event(0), expansion)
+    with timer("compute_frame_selected_source", frames=len(days)):
+        for day in days:
+            frames.compute_frame(day, args.num_of_shown_days, 0, expansion.selected_index, expansion)
+
+    results = {
+        'parameters': vars(args),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': multiprocessing.cpu_count()
+        },
+        'num_of_event_columns': model.num_of_event_columns,
+        'num_of_anomalies': len(data.anomalous_rows),
+        'num_of_detected_anomalies': num_of_detected,
+        'cache': frames.cache.get_statistics(),
+        'stages': timer.stages
+    }
+    if args.profile:
+        results['profile'] = visisc.profiler.get_statistics()
+        visisc.profiler.disable()
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--num-of-sources", type=int, default=100)
+    parser.add_argument("--num-of-classes", type=int, default=10)
+    parser.add_argument("--num-of-events", type=int, default=100)
+    parser.add_argument("--hierarchy-depth", type=int, default=3)
+    parser.add_argument("--hierarchy-width", type=int, default=5)
+    parser.add_argument("--num-of-severity-levels", type=int, default=1)
+    parser.add_argument("--num-of-days", type=int, default=100)
+    parser.add_argument("--sparsity", type=float, default=0.0,
+                        help="fraction of the events of a class that never occur, the counts are sparse if larger than 0")
+    parser.add_argument("--num-of-anomalies", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threshold", type=float, default=13.8, help="the decision threshold of the anomaly scores")
+    parser.add_argument("--n-jobs", type=int, default=1, help="worker processes used for scoring, -1 for one per CPU")
+    parser.add_argument("--shard-by-class", action="store_true", help="fit one anomaly detector per source class")
+    parser.add_argument("--num-of-rows", type=int, default=1000, help="rows scored one by one with calc_one")
+    parser.add_argument("--num-of-shown-days", type=int, default=30)
+    parser.add_argument("--num-of-frames", type=int, default=30)
+    parser.add_argument("--profile", action="store_true", help="include the timers and counters of visisc.profiler")
+    parser.add_argument("--output", default=None, help="the JSON file the results are written to, default stdout")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -78,54 +78,17 @@ def event_path(x): # Returns a list of strings with 3 elements
 def severity_level(x): # returns 3 different severity levels: 0, 1, 2
     return x-(x/3)*3
 
-class MySelectionQuery(visisc.EventSelectionQuery):
-    def __init__(self):
-        self.list_of_source_ids = [i for i in range(n_sources*n_source_classes)]
-        self.list_of_source_classes = [(i, "class_%i"%i) for i in range(n_source_classes)]
-        self.list_of_event_names = event_names
-        self.list_of_event_severity_levels = [(i, "Level %i"%i) for i in range(3)]
-        self.period_start_date = data.T[date_column].min()
-        self.period_end_date = data.T[date_column].max()
-    
-    def execute_query(self):
-        query = self
-        query.selected_list_of_source_ids = query.list_of_source_ids
-
-        data_query = np.array(
-            [
-            data[i] for i in range(len(data)) if 
-                data[i][source_column] in query.selected_list_of_source_ids and
-                data[i][class_column] in query.selected_list_of_source_classes and
-                data[i][date_column] >= query.period_start_date and
-                data[i][date_column] <= query.period_end_date
-            ]
-        )
-
-        event_columns = [first_event_column+event_names.index(e) for e in query.selected_list_of_event_names
-             if severity_level(first_event_column+event_names.index(e)) in query.selected_list_of_event_severity_levels]
-
-        model = visisc.EventDataModel.hierarchical_model(
-            event_columns=event_columns,
-            get_event_path = event_path,
-            get_severity_level = severity_level,
-            num_of_severity_levels=3
-        )
-
-        data_object = model.data_object(
-            data_query,
-            source_column = source_column,
-            class_column = class_column,
-            period_column=period_column,
-            date_column=date_column
-        )
-
-        anomaly_detector = model.fit_anomaly_detector(data_object,poisson_onesided=True)
-
-        vis = visisc.EventVisualization(model, 13.8,
-                                        start_day=data_object.dates_.max(),
-                                        precompute_cache=True)
-
-query = MySelectionQuery()
+query = visisc.IndexedEventSelectionQuery(
+    data,
+    event_columns=range(first_event_column, last_event_column),
+    source_column=source_column,
+    class_column=class_column,
+    date_column=date_column,
+    period_column=period_column,
+    get_event_path=event_path,
+    get_severity_level=severity_level,
+    num_of_severity_levels=3
+)
 
 dialog = visisc.EventSelectionDialog(
     query,
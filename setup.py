@@ -19,7 +19,7 @@ extra_flags = []
 visisc_dir = '_visisc_modules'
 
 
-py_modules = [os.path.join(visisc_dir, mod) for mod in ["__init__", "EventVisualization", "EventDataModel", "EventDataObject", "EventHierarchy", "EventSelectionDialog", "EventSelectionQuery"]]+["visisc"]
+py_modules = [os.path.join(visisc_dir, mod) for mod in ["__init__", "EventVisualization", "EventDataModel", "EventDataObject", "EventHierarchy", "EventSelectionDialog", "EventSelectionQuery", "EventScoreCache", "EventFrame", "EventScoreStore", "EventProfiler"]]+["visisc"]
 
 pylib = get_python_lib()
 
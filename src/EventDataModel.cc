@@ -70,6 +70,75 @@ void visisc::_EventDataModel::summarize_event_children(visisc::_EventHierEle* el
 	}
 }
 
+// Same as summarize_event_children, but using the compiled hierarchy and a data vector of doubles
+void visisc::_EventDataModel::_summarize_node(int node, const double* devs, const double* exps, const double* vec, double& maxdev, int& maxsev, int& maxcount, double& maxexp, int& maxind, int nosum) const
+{
+	const int* index = _node_index + node*_num_of_severity_levels;
+	const int* component = _node_component + node*_num_of_severity_levels;
+	int end = nosum ? node + 1 : _node_subtree_end[node];
+	maxcount = 0;
+	maxdev = 0.0;
+	maxexp = 0.0;
+	maxsev = -1;
+	maxind = -1;
+	for (int i=0; i<_num_of_severity_levels; i++) {
+		if (index[i] == -1) continue;
+		maxcount += (int) vec[index[i]+_offset];
+		maxexp += exps[component[i]];
+	}
+	for (; node < end; node++) {
+		index = _node_index + node*_num_of_severity_levels;
+		component = _node_component + node*_num_of_severity_levels;
+		for (int i=0; i<_num_of_severity_levels; i++)
+			if (index[i] != -1)
+				if (devs[component[i]] > maxdev)
+					maxsev = i, maxind = component[i], maxdev = devs[maxind];
+	}
+}
+
+int visisc::_EventDataModel::summarize_event_children_in_rows(const char* rows_buf, size_t rows_size,
+		const char* devs_buf, size_t devs_size, int num_of_devs,
+		const char* exps_buf, size_t exps_size, int num_of_exps,
+		const char* data_buf, size_t data_size, int num_of_columns,
+		_EventExpansion* expansion, int first_nosum_event,
+		char* maxdev_buf, size_t maxdev_size, char* maxsev_buf, size_t maxsev_size, char* maxcount_buf, size_t maxcount_size,
+		char* maxexp_buf, size_t maxexp_size, char* maxind_buf, size_t maxind_size) const
+{
+	int num_of_rows = rows_size / sizeof(int);
+	_EventHierEle** events = expansion ? expansion->events : _selected_events;
+	int num_of_events = expansion ? expansion->num_of_events : _num_of_selected_events;
+	size_t num_of_values = (size_t) num_of_rows*num_of_events;
+	const int* rows = (const int*) rows_buf;
+	const double* devs = (const double*) devs_buf;
+	const double* exps = (const double*) exps_buf;
+	const double* data = (const double*) data_buf;
+	double* maxdev = (double*) maxdev_buf;
+	double* maxexp = (double*) maxexp_buf;
+	int* maxsev = (int*) maxsev_buf;
+	int* maxcount = (int*) maxcount_buf;
+	int* maxind = (int*) maxind_buf;
+
+	if (!_nodes || num_of_columns <= 0 ||
+			devs_size != (size_t) num_of_rows*num_of_devs*sizeof(double) ||
+			exps_size != (size_t) num_of_rows*num_of_exps*sizeof(double) ||
+			data_size % (num_of_columns*sizeof(double)) != 0 ||
+			maxdev_size != num_of_values*sizeof(double) || maxexp_size != num_of_values*sizeof(double) ||
+			maxsev_size != num_of_values*sizeof(int) || maxcount_size != num_of_values*sizeof(int) ||
+			maxind_size != num_of_values*sizeof(int))
+		return 0;
+
+	int num_of_data_rows = data_size / (num_of_columns*sizeof(double));
+	for (int r = 0; r < num_of_rows; r++) {
+		if (rows[r] < 0 || rows[r] >= num_of_data_rows)
+			return 0;
+		for (int e = 0; e < num_of_events; e++) {
+			size_t k = (size_t) r*num_of_events + e;
+			_summarize_node(events[e]->node, devs + (size_t) r*num_of_devs, exps + (size_t) r*num_of_exps, data + (size_t) rows[r]*num_of_columns,
+					maxdev[k], maxsev[k], maxcount[k], maxexp[k], maxind[k], e >= first_nosum_event);
+		}
+	}
+	return 1;
+}
 
 visisc::_EventHierEle* visisc::_EventDataModel::get_selected_event(int event_index) {
 	_EventHierEle* ele0;
@@ -84,13 +153,23 @@ visisc::_EventHierEle* visisc::_EventDataModel::get_selected_event(int event_ind
 
 int visisc::_EventDataModel::expand_events(_EventHierEle* ele0)
 {
-	static visisc::_EventHierEle** elements = 0;
+	int selind = expand_events_into(ele0, &_expansion);
+	_selected_events = _expansion.events;
+	_num_of_selected_events = _expansion.num_of_events;
+	return selind;
+}
+
+int visisc::_EventDataModel::expand_events_into(_EventHierEle* ele0, _EventExpansion* expansion) const
+{
 	int k, num = 0, selind;
 	_EventHierEle* ele;
 
-	if (!elements)
-		elements = new visisc::_EventHierEle*[_event_hierarchy_size];
 	if (!ele0) {
+		for (ele=_event_hierarchy->child; ele; ele=ele->sibling)
+			num++;
+		expansion->reserve(num+1);
+		_EventHierEle** elements = expansion->events;
+		num = 0;
 		// översta noden och nivån närmast efter
 		for (ele=_event_hierarchy->child; ele; ele=ele->sibling)
 			elements[num++] = ele;
@@ -98,6 +177,13 @@ int visisc::_EventDataModel::expand_events(_EventHierEle* ele0)
 		elements[num++] = _event_hierarchy;
 	} else {
 		if (!ele0->child && ele0->parent) ele0 = ele0->parent;
+		for (ele=ele0->child; ele; ele=ele->sibling)
+			num++;
+		for (ele=ele0->parent; ele; ele=ele->parent)
+			num++;
+		expansion->reserve(num+1);
+		_EventHierEle** elements = expansion->events;
+		num = 0;
 		// Sen de direkta barnen
 		for (ele=ele0->child; ele; ele=ele->sibling)
 			elements[num++] = ele;
@@ -105,19 +191,11 @@ int visisc::_EventDataModel::expand_events(_EventHierEle* ele0)
 		selind = num;
 		elements[num++] = ele0;
 		// Först tidigare föräldrar
-		//    for (k=0, ele=ele0->parent; ele ; k++, ele=ele->parent);
-		//    num += k;
 		for (k=0, ele=ele0->parent; ele ; k++, ele=ele->parent)
 			elements[num++] = ele;
-		// Först tidigare syskon - NEJ
-		//    for (ele=(ele0->parent ? ele0->parent->child : event_hierarchy); ele && ele != ele0; ele=ele->sibling)
-		//      elements[num++] = ele;
-		// Sist senare syskon - NEJ
-		//    for (ele=ele0->sibling; ele; ele=ele->sibling)
-		//      elements[num++] = ele;
 	}
-	_selected_events = elements;
-	_num_of_selected_events = num;
+	expansion->num_of_events = num;
+	expansion->selected_index = selind;
 	return selind;
 }
 
@@ -209,10 +287,102 @@ visisc::_EventDataModel::_EventDataModel(_EventHierEle* event_hierarchy, int eve
 }
 
 visisc::_EventDataModel::~_EventDataModel() {
+	_delete_compiled_hierarchy();
 	if(DEBUG)
 		printf("EventDataModel deconstructed\n");
 }
 
+void visisc::_EventDataModel::_delete_compiled_hierarchy() {
+	delete [] _nodes;
+	delete [] _node_parent;
+	delete [] _node_subtree_end;
+	delete [] _node_depth;
+	delete [] _node_index;
+	delete [] _node_component;
+	_nodes = 0;
+	_node_parent = _node_subtree_end = _node_depth = _node_index = _node_component = 0;
+	_num_of_nodes = 0;
+	_node_by_name.clear();
+}
+
+void visisc::_EventDataModel::compile_hierarchy() {
+	_EventHierEle* ele;
+	int node, i;
+
+	_delete_compiled_hierarchy();
+
+	_num_of_severity_levels = get_global_num_of_severity_levels();
+	for (ele = _event_hierarchy; ele; ele = ele->event_hierarchy_next())
+		_num_of_nodes++;
+
+	_nodes = new _EventHierEle*[_num_of_nodes];
+	_node_parent = new int[_num_of_nodes];
+	_node_subtree_end = new int[_num_of_nodes];
+	_node_depth = new int[_num_of_nodes];
+	_node_index = new int[_num_of_nodes*_num_of_severity_levels];
+	_node_component = new int[_num_of_nodes*_num_of_severity_levels];
+	_node_by_name.reserve(_num_of_nodes);
+
+	// Depth first order, so a parent is always numbered before its children
+	for (node = 0, ele = _event_hierarchy; ele; node++, ele = ele->event_hierarchy_next()) {
+		_nodes[node] = ele;
+		ele->node = node;
+		_node_parent[node] = ele->parent ? ele->parent->node : -1;
+		_node_depth[node] = ele->parent ? _node_depth[ele->parent->node] + 1 : 0;
+		_node_subtree_end[node] = node + 1;
+		_node_by_name.emplace(ele->name, node);
+		for (i = 0; i < _num_of_severity_levels; i++) {
+			_node_index[node*_num_of_severity_levels+i] = ele->index[i];
+			_node_component[node*_num_of_severity_levels+i] = ele->index[i] == -1 ? -1 : ele->index_component[i];
+		}
+	}
+	// The subtree of a node ends where the subtree of its last descendant ends
+	for (node = _num_of_nodes-1; node > 0; node--)
+		if (_node_parent[node] != -1 && _node_subtree_end[node] > _node_subtree_end[_node_parent[node]])
+			_node_subtree_end[_node_parent[node]] = _node_subtree_end[node];
+}
+
+int visisc::_EventDataModel::find_node(const char* name) const {
+	std::unordered_map<std::string, int>::const_iterator it = _node_by_name.find(name);
+	return it == _node_by_name.end() ? -1 : it->second;
+}
+
+visisc::_EventHierEle* visisc::_EventDataModel::find_event(const char* name) const {
+	int node = find_node(name);
+	return node == -1 ? 0 : _nodes[node];
+}
+
+int visisc::_EventDataModel::get_event_index(const char* name) {
+	int i;
+	if (_num_of_nodes > 0) {
+		_EventHierEle* ele = find_event(name);
+		for (i = 0; ele && i < _num_of_selected_events; i++)
+			if (_selected_events[i] == ele)
+				return i;
+	} else {
+		for (i = 0; i < _num_of_selected_events; i++)
+			if (strcmp(_selected_events[i]->name, name) == 0)
+				return i;
+	}
+	return -1;
+}
+
+static int copy_ints_to_buffer(const int* values, int num_of_values, char* buf, size_t size) {
+	if (size != num_of_values*sizeof(int))
+		return 0;
+	memcpy(buf, values, size);
+	return 1;
+}
+
+int visisc::_EventDataModel::copy_compiled_hierarchy(char* parent_buf, size_t parent_size, char* subtree_end_buf, size_t subtree_end_size,
+		char* depth_buf, size_t depth_size, char* index_buf, size_t index_size, char* component_buf, size_t component_size) {
+	return copy_ints_to_buffer(_node_parent, _num_of_nodes, parent_buf, parent_size) &&
+			copy_ints_to_buffer(_node_subtree_end, _num_of_nodes, subtree_end_buf, subtree_end_size) &&
+			copy_ints_to_buffer(_node_depth, _num_of_nodes, depth_buf, depth_size) &&
+			copy_ints_to_buffer(_node_index, _num_of_nodes*_num_of_severity_levels, index_buf, index_size) &&
+			copy_ints_to_buffer(_node_component, _num_of_nodes*_num_of_severity_levels, component_buf, component_size);
+}
+
 
 
 
@@ -18,6 +18,8 @@
 #include <_DataObject.hh>
 #include <_AnomalyDetector.hh>
 #include <string.h>
+#include <string>
+#include <unordered_map>
 
 namespace visisc {
 
@@ -37,6 +39,7 @@ struct _EventHierEle {
 		index = new int[get_global_num_of_severity_levels()];
 		index_component = new int[get_global_num_of_severity_levels()];
 		for (int i=0; i<get_global_num_of_severity_levels(); i++) index[i] = -1; parent = sibling = child = 0;
+		node = -1;
 	};
 	~_EventHierEle() { delete [] name; delete [] index; delete [] index_component;};
 	int* index;
@@ -45,6 +48,8 @@ struct _EventHierEle {
 	_EventHierEle* sibling;
 	_EventHierEle* child;
 	int* index_component;
+	// Position of the element in the compiled (depth first ordered) hierarchy, -1 if not compiled
+	int node;
 
 	int get_index_value(int ind) {
 		return index[ind];
@@ -54,7 +59,7 @@ struct _EventHierEle {
 		return index_component[ind];
 	}
 
-	int set_index_component(int ind, int component) {
+	void set_index_component(int ind, int component) {
 		index_component[ind] = component;
 	}
 
@@ -74,6 +79,51 @@ inline visisc::_EventHierEle* visisc::_EventHierEle::event_hierarchy_next()
 }
 
 
+// The events shown for an expanded event, see _EventDataModel::expand_events_into. Each view (or thread) can
+// have its own expansion of the same model.
+struct _EventExpansion {
+
+	_EventExpansion() {
+		events = 0;
+		num_of_events = 0;
+		capacity = 0;
+		selected_index = -1;
+	};
+	~_EventExpansion() { delete [] events;};
+	_EventHierEle** events;
+	int num_of_events;
+	int capacity;
+	// Index of the expanded event among the events
+	int selected_index;
+
+	_EventHierEle* get_event(int event_index) {
+		return event_index > -1 && event_index < num_of_events ? events[event_index] : 0;
+	}
+
+	int get_num_of_events() {
+		return num_of_events;
+	}
+
+	int get_event_index(const char* name) {
+		for(int i=0; i < num_of_events; i++) {
+			if(strcmp(events[i]->name, name) == 0) {
+				return i;
+			}
+		}
+		return -1;
+	}
+
+	void reserve(int size) {
+		if (size > capacity) {
+			delete [] events;
+			events = new _EventHierEle*[size];
+			capacity = size;
+		}
+		num_of_events = 0;
+	}
+};
+
+
 class _EventDataModel {
 public:
 
@@ -86,7 +136,24 @@ public:
 
 	virtual _EventHierEle* get_selected_event(int message_index);
 	virtual int expand_events(_EventHierEle* ele0);
+	// Same as expand_events but the events are stored in the given expansion instead of as the selected events of
+	// the model. It only reads the hierarchy, so it can be called concurrently for different expansions.
+	virtual int expand_events_into(_EventHierEle* ele0, _EventExpansion* expansion) const;
 	virtual void summarize_event_children(_EventHierEle* ele, double* devs, double* exps, intfloat* vec, double& maxdev, int& maxsev, int& maxcount, double& maxexp, int& maxind, int nosum);
+	// Summarizes all selected events in many rows at once, same as summarize_event_children for each row and selected
+	// event, where nosum is 1 for the selected events with an index >= first_nosum_event. The events are the events of
+	// expansion, or the selected events of the model if expansion is 0. The input buffers are a row
+	// index array (int) and matrices with one row per row index: devs and exps (double), and the data matrix (double)
+	// with num_of_columns columns indexed by row index. The output buffers are matrices with one row per row index
+	// and one column per selected event: maxdev and maxexp (double), maxsev, maxcount and maxind (int).
+	// Requires a compiled hierarchy. Returns 0 if a buffer has the wrong size.
+	virtual int summarize_event_children_in_rows(const char* rows_buf, size_t rows_size,
+			const char* devs_buf, size_t devs_size, int num_of_devs,
+			const char* exps_buf, size_t exps_size, int num_of_exps,
+			const char* data_buf, size_t data_size, int num_of_columns,
+			_EventExpansion* expansion, int first_nosum_event,
+			char* maxdev_buf, size_t maxdev_size, char* maxsev_buf, size_t maxsev_size, char* maxcount_buf, size_t maxcount_size,
+			char* maxexp_buf, size_t maxexp_size, char* maxind_buf, size_t maxind_size) const;
 
 	virtual _EventHierEle** get_selected_events() {return _selected_events;};
 
@@ -98,18 +165,30 @@ public:
 		return names;
 	};
 
-	virtual int get_event_index(char* name) {
-		for(int i=0; i < get_event_hierarchy_size(); i++) {
-			if(strcmp(get_selected_event(i)->name, name) == 0) {
-				return i;
-			}
-		}
-
-		return -1;
-	}
+	// Returns the index of the event with the given name among the selected events or -1
+	virtual int get_event_index(const char* name);
 
 	virtual int get_num_of_selected_events() {return _num_of_selected_events;};
 
+	// Compiles the event hierarchy into flat arrays in depth first order (the same order as event_hierarchy_next),
+	// must be called again if the hierarchy is changed.
+	virtual void compile_hierarchy();
+	virtual int get_num_of_nodes() {return _num_of_nodes;};
+	virtual _EventHierEle* get_node(int node) {return _nodes[node];};
+	virtual int get_node_parent(int node) {return _node_parent[node];};
+	virtual int get_node_subtree_end(int node) {return _node_subtree_end[node];};
+	virtual int get_node_depth(int node) {return _node_depth[node];};
+	virtual int get_node_index_value(int node, int severity_level) {return _node_index[node*_num_of_severity_levels+severity_level];};
+	virtual int get_node_index_component(int node, int severity_level) {return _node_component[node*_num_of_severity_levels+severity_level];};
+	// Returns the node of the event with the given name or -1, looked up in a hash index of the compiled hierarchy.
+	// If several events have the same name, the first one in depth first order is returned.
+	virtual int find_node(const char* name) const;
+	virtual _EventHierEle* find_event(const char* name) const;
+	// Copies the compiled hierarchy into buffers (like numpy int32 arrays) of num_of_nodes elements, or
+	// num_of_nodes x num_of_severity_levels elements for index and component. Returns 0 if a buffer has the wrong size.
+	virtual int copy_compiled_hierarchy(char* parent_buf, size_t parent_size, char* subtree_end_buf, size_t subtree_end_size,
+			char* depth_buf, size_t depth_size, char* index_buf, size_t index_size, char* component_buf, size_t component_size);
+
 	int _offset;
 
 
@@ -118,6 +197,24 @@ protected:
 	int _event_hierarchy_size = 0;
 	_EventHierEle** _selected_events;
 	int _num_of_selected_events;
+
+	// The compiled hierarchy, index and component are num_of_nodes x num_of_severity_levels matrices, where -1
+	// means that the severity level is not used by the node.
+	int _num_of_nodes = 0;
+	int _num_of_severity_levels = 0;
+	_EventHierEle** _nodes = 0;
+	int* _node_parent = 0;
+	int* _node_subtree_end = 0;
+	int* _node_depth = 0;
+	int* _node_index = 0;
+	int* _node_component = 0;
+	std::unordered_map<std::string, int> _node_by_name;
+
+	virtual void _delete_compiled_hierarchy();
+	void _summarize_node(int node, const double* devs, const double* exps, const double* vec, double& maxdev, int& maxsev, int& maxcount, double& maxexp, int& maxind, int nosum) const;
+
+	// Used by expand_events for the selected events of the model
+	_EventExpansion _expansion;
 };
 
 }  // namespace visisc
@@ -13,21 +13,49 @@
  %}
 
  %include <typemaps.i>
+ %include <pybuffer.i>
 
  %apply int &OUTPUT {int& maxsev, int& maxcount, int& maxind}
  %apply double &OUTPUT {double& maxdev, double& maxexp}
  %apply int &OUTPUT {int& selind}
  %apply pyisc::_EventHierEle** &OUTPUT {pyisc::_EventHierEle**& eles}
 
+ // Writable buffers, like numpy arrays, used for copying arrays to and from Python without element-wise calls
+ %pybuffer_mutable_binary(char* parent_buf, size_t parent_size)
+ %pybuffer_mutable_binary(char* subtree_end_buf, size_t subtree_end_size)
+ %pybuffer_mutable_binary(char* depth_buf, size_t depth_size)
+ %pybuffer_mutable_binary(char* index_buf, size_t index_size)
+ %pybuffer_mutable_binary(char* component_buf, size_t component_size)
+ %pybuffer_binary(const char* rows_buf, size_t rows_size)
+ %pybuffer_binary(const char* devs_buf, size_t devs_size)
+ %pybuffer_binary(const char* exps_buf, size_t exps_size)
+ %pybuffer_binary(const char* data_buf, size_t data_size)
+ %pybuffer_mutable_binary(char* maxdev_buf, size_t maxdev_size)
+ %pybuffer_mutable_binary(char* maxsev_buf, size_t maxsev_size)
+ %pybuffer_mutable_binary(char* maxcount_buf, size_t maxcount_size)
+ %pybuffer_mutable_binary(char* maxexp_buf, size_t maxexp_size)
+ %pybuffer_mutable_binary(char* maxind_buf, size_t maxind_size)
+
+ // Only reads the buffers and the compiled hierarchy, so other Python threads can run meanwhile
+ %exception visisc::_EventDataModel::summarize_event_children_in_rows {
+   Py_BEGIN_ALLOW_THREADS
+   $action
+   Py_END_ALLOW_THREADS
+ }
+
  %include "src/EventDataModel.hh"
 
 
  %pythoncode %{
+from _visisc_modules.EventProfiler import EventProfiler, profiler, profiled
 from _visisc_modules.EventHierarchy import *
-from _visisc_modules.EventDataObject import EventDataObject
+from _visisc_modules.EventDataObject import EventDataObject, SparseEventDataObject
+from _visisc_modules.EventScoreStore import EventScoreStore
 from _visisc_modules.EventDataModel import EventDataModel
+from _visisc_modules.EventScoreCache import EventScoreCache
+from _visisc_modules.EventFrame import EventFrame, EventFrameComputer, EventFramePrefetcher, to_day_number, from_day_number
 from _visisc_modules.EventVisualization import EventVisualization
-from _visisc_modules.EventSelectionQuery import EventSelectionQuery
+from _visisc_modules.EventSelectionQuery import EventSelectionQuery, IndexedEventSelectionQuery
 from _visisc_modules.EventSelectionDialog import EventSelectionDialog
 
  %}